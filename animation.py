@@ -0,0 +1,100 @@
+from typing import Optional, Sequence
+
+from pygame import Surface
+
+__doc__ = """
+    Author: Mouaz Tabboush
+
+    animation - Plays prebuilt frame sequences
+    ==========================================
+
+    An Animation is a sequence of frames with the time between two frames
+    and what happens after the last frame:
+
+    * LOOP: starts again at the first frame
+    * CLAMP: stays on the last frame
+
+    Sprites build a table of their animations once, e.g. by state and direction
+    (see `Player.build_animations()`), and keep an Animator for their current frame.
+    Animating a sprite is then a lookup in that table and one step of the animator.
+
+    Requirements
+    ============
+    * pygame
+"""
+
+# what happens after the last frame of an animation
+LOOP = 0
+CLAMP = 1
+
+
+class Animation:
+    """A sequence of frames that is shared by all sprites that play it."""
+
+    __slots__ = ("frames", "frame_time", "mode", "last")
+
+    def __init__(self, frames: Sequence[Surface], frame_time: int, mode: int = LOOP):
+        """
+        Parameters
+        ----------
+        frames: the frames in the order they are shown
+        frame_time: time a frame is shown, in ms
+        mode: LOOP or CLAMP
+
+        Tests
+        -----
+        * passing no frames"""
+        self.frames = tuple(frames)
+        self.frame_time = frame_time
+        self.mode = mode
+        # index of the last frame
+        self.last = len(self.frames) - 1
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def next_frame(self, index: int) -> int:
+        """returns the index of the frame that comes after index"""
+        if self.mode == LOOP:
+            return (index + 1) % len(self.frames)
+        return min(index + 1, self.last)
+
+
+class Animator:
+    """The current frame of one sprite and when it was shown.
+
+    The frame index is kept when the sprite switches to another animation,
+    so animations of the same length continue where the last one was."""
+
+    __slots__ = ("frame", "last_update")
+
+    def __init__(self, now: int = 0):
+        """
+        Parameters
+        ----------
+        now: game time in ms the first frame is shown at"""
+        self.frame = 0
+        self.last_update = now
+
+    def reset(self, now: int) -> None:
+        """starts again at the first frame"""
+        self.frame = 0
+        self.last_update = now
+
+    def play(self, animation: Animation, now: int) -> Optional[Surface]:
+        """steps to the next frame of an animation once its frame time has passed.
+        returns the new frame, or None if the frame didn't change.
+
+        Parameters
+        ----------
+        animation: the animation to play
+        now: the current game time in ms
+
+        Tests
+        -----
+        * index of the last animation larger than the new animation"""
+        if now - self.last_update <= animation.frame_time:
+            return None
+        self.last_update = now
+        self.frame = animation.next_frame(self.frame)
+        return animation.frames[self.frame]
@@ -0,0 +1,270 @@
+import hashlib
+import inspect
+import json
+import marshal
+import os
+import struct
+from typing import Dict, Iterable
+
+import pygame as pg
+from pygame import Surface
+
+from atlas import is_up_to_date
+from settings import ASSET_CACHE_PATH, GAME_PATH
+from util import print_log
+
+__doc__ = """
+    Author: Mouaz Tabboush
+
+    assetcache - Stores finished sprite frames on disk
+    ==================================================
+
+    The frames of a sprite are built from spritesheets by scaling, flipping and
+    setting colorkeys (see the builders registered in `Game.load_data()`).
+    `write_asset()` saves the result of a builder as raw pixel data in the format of the display,
+    together with the colorkey of every frame. `read_asset()` copies the pixels straight
+    into new surfaces, without decoding, converting, scaling or flipping anything.
+
+    Cache files are named after the asset and a hash of the builder, the names of the files it reads
+    and its params: the settings and helper functions or classes it depends on.
+    Changing any of them results in a new cache file. The files it reads are not hashed,
+    the cache file records their sizes and is outdated when one of them changes its size
+    or is modified after the cache file was written (see `atlas.is_up_to_date()`).
+
+    `python bake.py` writes the cache files ahead of time, otherwise they are written
+    the first time the game builds the asset.
+
+    File format
+    ===========
+    * header: magic, version, length of the index
+    * index: JSON describing how the frames are nested in lists, tuples and dicts,
+      and the size, pitch, pixel format and colorkey of every frame
+    * pixel data of every frame, exactly as it is stored inside the surface
+
+    Requirements
+    ============
+    * pygame
+    * inspect
+    * json
+    * marshal
+    * atlas
+    * settings
+    * util
+"""
+
+ASSET_CACHE_MAGIC = b"XAST"
+ASSET_CACHE_VERSION = 1
+ASSET_CACHE_HEADER = struct.Struct("<4sII") # magic, version, index length
+
+
+def param_bytes(param) -> bytes:
+    """returns what is hashed of a builder param:
+    the code of a function, the code of every method of a class and the repr of anything else
+
+    Tests
+    -----
+    * passing a function wrapped by a decorator
+    * passing a builtin function"""
+    if isinstance(param, type):
+        return b"".join(param_bytes(value) for _, value in sorted(vars(param).items())
+                        if callable(value) or isinstance(value, (staticmethod, classmethod)))
+    if isinstance(param, (staticmethod, classmethod)):
+        param = param.__func__
+    code = getattr(inspect.unwrap(param), "__code__", None) if callable(param) else None
+    if code is not None:
+        return marshal.dumps(code)
+    return repr(param).encode()
+
+
+def source_stats(sources: Iterable[str]) -> Dict[str, os.stat_result]:
+    """returns the os.stat of every file a builder reads by its path relative to the game folder.
+    folders are replaced by the files inside them.
+
+    Tests
+    -----
+    * a source that doesn't exist"""
+    stats = {}
+    for source in sources:
+        if os.path.isdir(source):
+            with os.scandir(source) as entries:
+                for entry in sorted(entries, key=lambda entry: entry.name):
+                    if entry.is_file():
+                        stats[os.path.relpath(entry.path, GAME_PATH)] = entry.stat()
+        else:
+            stats[os.path.relpath(source, GAME_PATH)] = os.stat(source)
+    return stats
+
+
+def asset_hash(builder, sources: Iterable[str], params: Iterable = ()) -> str:
+    """returns a hash of a builder's code, the names of the files it reads and its params.
+    the content of the files is not read, see `read_asset()`.
+
+    Parameters
+    ----------
+    builder: function that builds the asset
+    sources: files or folders the builder reads
+    params: settings, options and helper functions or classes the builder depends on,
+            e.g. a colorkey or the class of a spritesheet"""
+    sha = hashlib.sha1(marshal.dumps(builder.__code__))
+    for param in params:
+        sha.update(param_bytes(param))
+    for source in sources:
+        sha.update(os.path.relpath(source, GAME_PATH).encode())
+    return sha.hexdigest()
+
+
+def asset_cache_file(name: str, source_hash: str) -> str:
+    """returns the path of the cache file of an asset
+
+    Parameters
+    ----------
+    name: name of the asset inside the registry
+    source_hash: the hash returned by `asset_hash()`"""
+    return os.path.join(ASSET_CACHE_PATH, f"{name}-{source_hash[:16]}.frames")
+
+
+def write_asset(cache_file: str, asset, stats: Dict[str, os.stat_result] = None) -> None:
+    """saves an asset made of surfaces inside lists, tuples and dicts.
+    old cache files of the same asset are removed.
+
+    Parameters
+    ----------
+    cache_file: path returned by `asset_cache_file()`
+    asset: the result of a builder
+    stats: (optional) the files the builder read, see `source_stats()`
+
+    Tests
+    -----
+    * ./assets/cache not writable
+    * asset containing something that is not a surface, list, tuple or dict"""
+    surfaces = []
+    pixels = []
+    ids = {}
+
+    def describe(item):
+        if isinstance(item, Surface):
+            # surfaces that are used more than once are stored once
+            key = id(item)
+            if key not in ids:
+                ids[key] = len(surfaces)
+                if item.get_parent() is not None:
+                    # subsurfaces share the rows of their parent, copy the frame out of it
+                    item = item.copy()
+                colorkey = item.get_colorkey()
+                data = item.get_buffer().raw
+                surfaces.append([*item.get_size(), item.get_pitch(),
+                                 item.get_flags() & pg.SRCALPHA, item.get_bitsize(),
+                                 list(item.get_masks()),
+                                 list(colorkey[:3]) if colorkey else None, len(data)])
+                pixels.append(data)
+            return {"surface": ids[key]}
+        if isinstance(item, list):
+            return {"list": [describe(x) for x in item]}
+        if isinstance(item, tuple):
+            return {"tuple": [describe(x) for x in item]}
+        if isinstance(item, dict):
+            return {"dict": {key: describe(x) for key, x in item.items()}}
+        raise TypeError(f"can't store {type(item).__name__} in an asset cache")
+
+    sizes = {path: stat.st_size for path, stat in (stats or {}).items()}
+    index = json.dumps({"asset": describe(asset), "surfaces": surfaces, "sources": sizes}).encode()
+    os.makedirs(ASSET_CACHE_PATH, exist_ok=True)
+    temp_file = cache_file + ".tmp"
+    with open(temp_file, "wb") as fh:
+        fh.write(ASSET_CACHE_HEADER.pack(ASSET_CACHE_MAGIC, ASSET_CACHE_VERSION, len(index)))
+        fh.write(index)
+        for data in pixels:
+            fh.write(data)
+    os.replace(temp_file, cache_file)
+    remove_old_asset_files(cache_file)
+    print_log(f"<assetcache.write_asset>:baked {len(surfaces)} frames into {os.path.basename(cache_file)}")
+
+
+def read_index(fh, cache_file: str) -> dict:
+    """reads the header and the index of an opened cache file.
+    raises ValueError if it is not a valid cache file"""
+    header = fh.read(ASSET_CACHE_HEADER.size)
+    if len(header) != ASSET_CACHE_HEADER.size:
+        raise ValueError(f"{cache_file} is truncated")
+    magic, version, index_length = ASSET_CACHE_HEADER.unpack(header)
+    if magic != ASSET_CACHE_MAGIC or version != ASSET_CACHE_VERSION:
+        raise ValueError(f"{cache_file} is not a valid asset cache file")
+    return json.loads(fh.read(index_length))
+
+
+def is_asset_up_to_date(cache_file: str, stats: Dict[str, os.stat_result]) -> bool:
+    """returns True if a cache file exists and the files its asset was built from haven't changed since.
+    only the index of the cache file is read
+
+    Parameters
+    ----------
+    cache_file: path returned by `asset_cache_file()`
+    stats: the files the builder reads, see `source_stats()`"""
+    if not os.path.isfile(cache_file):
+        return False
+    try:
+        with open(cache_file, "rb") as fh:
+            index = read_index(fh, cache_file)
+    except (OSError, ValueError):
+        return False
+    return is_up_to_date(cache_file, index.get("sources"), stats)
+
+
+def read_asset(cache_file: str, stats: Dict[str, os.stat_result] = None):
+    """loads an asset saved by `write_asset()`.
+    frames with a colorkey are set up for RLE accelerated blitting.
+    raises ValueError if the file is not a valid cache file, the files its asset was built from
+    have changed or its frames don't have the pixel format of the display anymore.
+
+    Parameters
+    ----------
+    cache_file: path returned by `asset_cache_file()`
+    stats: (optional) the files the builder reads, see `source_stats()`
+
+    Tests
+    -----
+    * file of an older version
+    * truncated file
+    * display with another pixel format
+    * a source edited after the file was written"""
+    display_masks = list(pg.display.get_surface().get_masks())
+    surfaces = []
+    with open(cache_file, "rb") as fh:
+        index = read_index(fh, cache_file)
+        if stats is not None and not is_up_to_date(cache_file, index.get("sources"), stats):
+            raise ValueError(f"{cache_file} is outdated")
+
+        for width, height, pitch, alpha, bitsize, masks, colorkey, length in index["surfaces"]:
+            if not alpha and masks != display_masks:
+                raise ValueError(f"{cache_file} was made for another pixel format")
+            image = Surface((width, height), alpha, bitsize, masks)
+            if image.get_pitch() != pitch:
+                raise ValueError(f"{cache_file} was made for another pixel format")
+            # the pixels are read straight into the surface
+            with memoryview(image.get_view("0")) as view:
+                if fh.readinto(view) != length:
+                    raise ValueError(f"{cache_file} is truncated")
+            if colorkey is not None:
+                image.set_colorkey(colorkey, pg.RLEACCEL)
+            surfaces.append(image)
+
+    def build(item):
+        kind, value = next(iter(item.items()))
+        if kind == "surface":
+            return surfaces[value]
+        if kind == "list":
+            return [build(x) for x in value]
+        if kind == "tuple":
+            return tuple(build(x) for x in value)
+        return {key: build(x) for key, x in value.items()}
+
+    return build(index["asset"])
+
+
+def remove_old_asset_files(cache_file: str) -> None:
+    """removes cache files that belong to older versions of the same asset"""
+    name = os.path.basename(cache_file)
+    prefix = name.rsplit("-", 1)[0] + "-"
+    for old_file in os.listdir(ASSET_CACHE_PATH):
+        if old_file.startswith(prefix) and old_file.endswith(".frames") and old_file != name:
+            os.remove(os.path.join(ASSET_CACHE_PATH, old_file))
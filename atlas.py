@@ -0,0 +1,176 @@
+import json
+import os
+import sys
+from typing import Dict, List, Tuple
+
+__doc__ = """
+    Author: Mouaz Tabboush
+
+    atlas - Packs a folder of frames into one image
+    ===============================================
+
+    Loading a folder of frames means opening and decoding every file on its own.
+    `pack_atlas()` packs all images of a folder into one atlas image and writes
+    an index of the rect of every frame next to it, so the game can load all frames
+    with a single decode (see `ImageCollection`).
+
+    Every frame is surrounded by a one pixel border that repeats its edge pixels,
+    so scaling the whole atlas with scale2x gives the same frames as scaling each frame.
+
+    The atlas is a build product of the folder: the index records the size of every frame,
+    and `load_atlas_index()` only uses it while the folder has the same files with the same sizes
+    and none of them was modified after the index was written. That takes one os.stat per frame
+    and no reads, so it stays cheaper than loading the frames.
+
+    Pack the player frames with:
+
+        python atlas.py assets/xeon_frames assets/xeon_frames_atlas
+
+    Requirements
+    ============
+    * pygame
+    * json
+"""
+
+# no window is needed for packing
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "hide"
+
+import pygame as pg
+from pygame import Rect, Surface
+
+ATLAS_WIDTH = 512 # frames are placed in rows until the row is full
+PADDING = 1
+
+
+def atlas_files(atlas: str) -> Tuple[str, str]:
+    """returns the paths of the atlas image and its index
+
+    Parameters
+    ----------
+    atlas: path of the atlas without an extension"""
+    return atlas + ".png", atlas + ".json"
+
+
+def source_stats(directory: str) -> Dict[str, os.stat_result]:
+    """returns the os.stat of every file in a folder by its name"""
+    with os.scandir(directory) as entries:
+        return {entry.name: entry.stat() for entry in sorted(entries, key=lambda entry: entry.name)
+                if entry.is_file()}
+
+
+def is_up_to_date(product: str, sizes: Dict[str, int], stats: Dict[str, os.stat_result]) -> bool:
+    """returns True if the sources of a build product still have the sizes recorded in it
+    and none of them was modified after the product was written.
+    only names, sizes and modification times are compared, no file is read.
+
+    Parameters
+    ----------
+    product: path of the file that was built last, e.g. the atlas index
+    sizes: size of every source by its name, as recorded when the product was built
+    stats: os.stat of every source by its name, see `source_stats()`"""
+    if sizes != {name: stat.st_size for name, stat in stats.items()}:
+        return False
+    built = os.stat(product).st_mtime_ns
+    return all(stat.st_mtime_ns <= built for stat in stats.values())
+
+
+def place_frames(sizes: Dict[str, Tuple[int, int]], width: int = ATLAS_WIDTH) -> Tuple[Dict[str, Rect], int, int]:
+    """places frames in rows, the tallest frames first.
+    returns the rect of every frame without its border and the size of the atlas.
+
+    Parameters
+    ----------
+    sizes: width and height of every frame by its name
+    width: how wide the atlas can get
+
+    Tests
+    -----
+    * a frame wider than width"""
+    rects = {}
+    x = y = row_height = atlas_width = 0
+    for name in sorted(sizes, key=lambda name: (-sizes[name][1], name)):
+        w, h = sizes[name]
+        if x and x + w + 2 * PADDING > width:
+            x = 0
+            y += row_height
+            row_height = 0
+        rects[name] = Rect(x + PADDING, y + PADDING, w, h)
+        x += w + 2 * PADDING
+        row_height = max(row_height, h + 2 * PADDING)
+        atlas_width = max(atlas_width, x)
+    return rects, atlas_width, y + row_height
+
+
+def pack_atlas(directory: str, atlas: str) -> None:
+    """packs all images inside a folder into an atlas image and an index.
+    the frames are converted like ImageCollection does, so a display mode must be set.
+
+    Parameters
+    ----------
+    directory: folder of the frames
+    atlas: path of the atlas without an extension
+
+    Tests
+    -----
+    * folder containing files that are not images
+    * no display mode set"""
+    frames = {}
+    stats = source_stats(directory)
+    for name in stats:
+        try:
+            frames[name] = pg.image.load(os.path.join(directory, name)).convert()
+        except pg.error:
+            print(f"skipping {name}, not an image")
+    rects, width, height = place_frames({name: frame.get_size() for name, frame in frames.items()})
+
+    image = Surface((width, height)).convert()
+    for name, rect in rects.items():
+        frame = frames[name]
+        image.blit(frame, rect)
+        # repeat the edge pixels around the frame
+        image.blit(frame, (rect.left - PADDING, rect.top), (0, 0, 1, rect.height))
+        image.blit(frame, (rect.right, rect.top), (rect.width - 1, 0, 1, rect.height))
+        top = image.subsurface((rect.left - PADDING, rect.top, rect.width + 2 * PADDING, 1)).copy()
+        bottom = image.subsurface((rect.left - PADDING, rect.bottom - 1, rect.width + 2 * PADDING, 1)).copy()
+        image.blit(top, (rect.left - PADDING, rect.top - PADDING))
+        image.blit(bottom, (rect.left - PADDING, rect.bottom))
+
+    image_file, index_file = atlas_files(atlas)
+    pg.image.save(image, image_file)
+    with open(index_file, "w") as fh:
+        json.dump({
+            "image": os.path.basename(image_file),
+            "sources": {name: stat.st_size for name, stat in stats.items()},
+            "frames": {name: list(rect) for name, rect in sorted(rects.items())},
+        }, fh, indent=1)
+    print(f"packed {len(rects)} frames into {image_file} ({width}x{height})")
+
+
+def load_atlas_index(directory: str, atlas: str) -> Dict[str, List[int]]:
+    """returns the frame rects of an atlas by their name,
+    or None if the atlas is missing or the folder has changed since it was packed, see `is_up_to_date()`.
+
+    Parameters
+    ----------
+    directory: folder the atlas was packed from
+    atlas: path of the atlas without an extension"""
+    image_file, index_file = atlas_files(atlas)
+    if not os.path.isfile(image_file) or not os.path.isfile(index_file):
+        return None
+    with open(index_file) as fh:
+        index = json.load(fh)
+    if os.path.isdir(directory) and not is_up_to_date(index_file, index.get("sources"), source_stats(directory)):
+        return None
+    return index["frames"]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python atlas.py <frame folder> <atlas path without extension>")
+        sys.exit(1)
+    pg.init()
+    pg.display.set_mode((1, 1))
+    pack_atlas(sys.argv[1], sys.argv[2])
+    pg.quit()
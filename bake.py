@@ -0,0 +1,81 @@
+import os
+
+__doc__ = """
+    Author: Mouaz Tabboush
+
+    bake - Prepares game data ahead of time
+    =======================================
+
+    Running `python bake.py` compiles every map inside `./maps` into a level file
+    and bakes its rendered chunks into `./maps/cache`,
+    so the game doesn't have to do it on the first start.
+    It also bakes the finished player and projectile frames into `./assets/cache`
+    (see `AssetRegistry.register_baked()`), so the game doesn't scale, flip and colorkey them on every start.
+    Maps and frames that are already up to date are skipped.
+
+    The game bakes missing maps and frames by itself, so running this script is optional.
+
+    Requirements
+    ============
+    * pygame
+    * settings
+    * sprites
+    * tilemap
+"""
+
+# no window is needed for baking
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "hide"
+
+import pygame as pg
+
+from settings import MAP_PATH
+from sprites import AssetRegistry
+from tilemap import TiledMap, bake_map
+
+
+def bake_maps() -> None:
+    """compiles and bakes every tmx file inside ./maps that is not up to date.
+    Loading a TiledMap compiles the level if needed.
+
+    Tests
+    -----
+    * ./maps missing
+    * problem with bake_map()"""
+    for name in sorted(os.listdir(MAP_PATH)):
+        if not name.endswith(".tmx"):
+            continue
+        print(f"{name}: loading...")
+        tiled_map = TiledMap(os.path.join(MAP_PATH, name))
+        if tiled_map.cache_file is None or os.path.isfile(tiled_map.cache_file):
+            print(f"{name}: up to date")
+            continue
+        print(f"{name}: baking...")
+        bake_map(tiled_map)
+
+
+def bake_assets() -> None:
+    """bakes the frames registered by `AssetRegistry.register_baked()` that are not up to date.
+    the frames are stored in the pixel format of the display, so they must be baked after set_mode
+
+    Tests
+    -----
+    * ./assets/cache not writable
+    * a source of the frames missing"""
+    assets = AssetRegistry(None)
+    assets.register_baked()
+    for name in assets.builders:
+        if assets.is_cached(name):
+            print(f"{name}: up to date")
+            continue
+        print(f"{name}: baking...")
+        assets.load(name)
+
+
+if __name__ == "__main__":
+    pg.init()
+    # loading tile images and converting frames needs a display mode
+    pg.display.set_mode((1, 1))
+    bake_maps()
+    bake_assets()
+    pg.quit()
@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple
+
+__doc__ = """
+    Author: Mouaz Tabboush
+
+    benchmark - Measures the frame time of repeatable game scenarios
+    ================================================================
+
+    Each scenario loads a level, adds extra sprites to it and runs a number of frames
+    with the input script of `headless.py`. Every frame is split into four phases
+    which are timed separately:
+
+    * events -> `Game.events()`
+    * update -> `Game.update_sprites()`
+    * collision -> `Game.check_collisions()`
+    * draw -> `Game.draw()` (drawn on SDL's dummy display)
+
+    The mean and 99th percentile of each phase and of the whole frame are saved as JSON.
+    When a baseline JSON is passed, the run fails if the mean or p99 frame time
+    of any scenario got slower by more than the threshold:
+
+        python benchmark.py --output before.json
+        python benchmark.py --baseline before.json --threshold 0.2
+
+    Requirements
+    ============
+    * pygame
+    * argparse
+    * json
+    * headless
+    * projectiles
+    * sprites
+    * settings
+"""
+
+from headless import DEFAULT_SCRIPT, HeadlessGame, InputScript, pg
+from settings import LEVEL1_PATH, LEVEL2_PATH
+from projectiles import PLAYER
+from sprites import BaseEnemy, HealthDrop, vec
+
+PHASES = ["events", "update", "collision", "draw"]
+
+
+class Scenario(NamedTuple):
+    """A level and the functions that prepare it"""
+    level: str
+    # called once after the level has been set up
+    populate: Callable[[HeadlessGame], None]
+    # called before each frame, outside of the measured time
+    before_frame: Callable[[HeadlessGame, int], None]
+
+
+def nothing(*args) -> None:
+    """used for scenarios that need no preparation"""
+
+
+def random_floor_position(game: HeadlessGame):
+    """returns a random position on top of a platform of the current map"""
+    x, y, w, h = random.choice(game.map.colliders)
+    return x + random.random() * w, y
+
+
+def spawn_enemies(count: int) -> Callable[[HeadlessGame], None]:
+    """returns a function that spawns enemies on random platforms"""
+    def populate(game: HeadlessGame) -> None:
+        for _ in range(count):
+            enemy = BaseEnemy(game, *random_floor_position(game))
+            game.all_sprites.add(enemy)
+            game.all_enemies.add(enemy)
+            game.all_physics_objects.add(enemy)
+    return populate
+
+
+def spawn_healthdrops(count: int) -> Callable[[HeadlessGame], None]:
+    """returns a function that spawns healthdrops on random platforms"""
+    def populate(game: HeadlessGame) -> None:
+        for _ in range(count):
+            healthdrop = HealthDrop(game, *random_floor_position(game))
+            game.all_sprites.add(healthdrop)
+            game.coins.add(healthdrop)
+    return populate
+
+
+def keep_projectiles(count: int) -> Callable[[HeadlessGame, int], None]:
+    """returns a function that refills the player's projectiles up to count"""
+    def before_frame(game: HeadlessGame, frame: int) -> None:
+        if game.projectile_arrays is not None:
+            alive = game.projectile_arrays.count_owned(PLAYER)
+        else:
+            alive = len(game.player_projectiles)
+        for _ in range(count - alive):
+            facing_right = random.random() < 0.5
+            game.spawn_projectile(random.random() * game.map.width,
+                                  random.random() * game.map.height,
+                                  10 if facing_right else -10, facing_right, game.player)
+    return before_frame
+
+
+def sweep_camera(game: HeadlessGame, frame: int) -> None:
+    """moves the player across the whole map, so the camera follows it"""
+    x = frame * 64 % game.map.width
+    game.player.pos = vec(x, game.map.height // 2)
+    game.player.vel = vec(0, 0)
+    game.player.rect.midbottom = game.player.pos
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "level1": Scenario(LEVEL1_PATH, nothing, nothing),
+    "level2": Scenario(LEVEL2_PATH, nothing, nothing),
+    "enemies_1k": Scenario(LEVEL2_PATH, spawn_enemies(1000), nothing),
+    "projectiles_10k": Scenario(LEVEL2_PATH, nothing, keep_projectiles(10000)),
+    "healthdrops_500": Scenario(LEVEL2_PATH, spawn_healthdrops(500), nothing),
+    "camera_sweep": Scenario(LEVEL2_PATH, nothing, sweep_camera),
+}
+
+
+def summarize(times: List[int]) -> Dict[str, float]:
+    """returns the mean and 99th percentile of a list of nanoseconds in milliseconds"""
+    ordered = sorted(times)
+    return {
+        "mean_ms": sum(ordered) / len(ordered) / 1e6,
+        "p99_ms": ordered[int(0.99 * (len(ordered) - 1))] / 1e6,
+    }
+
+
+def run_scenario(game: HeadlessGame, scenario: Scenario, frames: int,
+                 warmup: int) -> Dict[str, Dict[str, float]]:
+    """runs a scenario and returns the summary of every phase and the whole frame
+
+    Tests
+    -----
+    * passing 0 frames
+    * the player dying during the scenario"""
+    random.seed(0)
+    if game.map_name != scenario.level:
+        game.set_map(scenario.level)
+    game.tick_count = 0
+    game.setup()
+    # the player should survive the whole scenario
+    game.player.health = 10 ** 9
+    scenario.populate(game)
+    game.playing = True
+
+    times = {phase: [] for phase in PHASES + ["frame"]}
+    clock = time.perf_counter_ns
+    for frame in range(warmup + frames):
+        scenario.before_frame(game, frame)
+        start = clock()
+        game.events()
+        events_done = clock()
+        game.update_sprites()
+        update_done = clock()
+        game.check_collisions()
+        collision_done = clock()
+        game.draw()
+        draw_done = clock()
+        game.tick_count += 1
+        if frame < warmup:
+            continue
+        times["events"].append(events_done - start)
+        times["update"].append(update_done - events_done)
+        times["collision"].append(collision_done - update_done)
+        times["draw"].append(draw_done - collision_done)
+        times["frame"].append(draw_done - start)
+
+    return {phase: summarize(phase_times) for phase, phase_times in times.items()}
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """returns a message for every scenario whose frame time got worse than the threshold allows
+
+    Parameters
+    ----------
+    results: the results of this run
+    baseline: the results of an earlier run
+    threshold: allowed slowdown, 0.2 means 20%"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for stat in ("mean_ms", "p99_ms"):
+            before = baseline[name]["frame"][stat]
+            after = result["frame"][stat]
+            if before > 0 and after > before * (1 + threshold):
+                regressions.append(f"{name}: frame {stat} {before:.3f} -> {after:.3f} "
+                                   f"(+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main() -> int:
+    """parses the command line, runs the scenarios and returns the exit code"""
+    parser = argparse.ArgumentParser(description="Measures the frame time of game scenarios.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run, can be passed more than once (default: all)")
+    parser.add_argument("--frames", type=int, default=300, help="measured frames per scenario")
+    parser.add_argument("--warmup", type=int, default=30, help="frames run before measuring")
+    parser.add_argument("--output", default="benchmark.json", help="where to save the results")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown compared to the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    pg.init()
+    game = HeadlessGame(InputScript(DEFAULT_SCRIPT), 0)
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        results[name] = run_scenario(game, SCENARIOS[name], args.frames, args.warmup)
+        print(f"{name:<16}" + "  ".join(
+            f"{phase} {results[name][phase]['mean_ms']:7.3f}/{results[name][phase]['p99_ms']:7.3f}"
+            for phase in PHASES + ["frame"]) + "  (mean/p99 ms)")
+    game.quit()
+
+    with open(args.output, "w") as fh:
+        json.dump(results, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = find_regressions(results, json.load(fh), args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
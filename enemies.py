@@ -0,0 +1,264 @@
+import random
+
+import pygame as pg
+
+from settings import PLAYER_FRICTION, PLAYER_GRAVITY
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+NUMPY_AVAILABLE = np is not None
+
+__doc__ = """
+    Author: Mouaz Tabboush
+
+    enemies - Updates all enemies at once with numpy
+    ================================================
+
+    EnemyArrays stores the position, velocity, acceleration and last shot of every enemy
+    in numpy arrays and updates them in one step per game update:
+
+    * gravity, friction and the equation of motion for all enemies at once
+    * landing on platforms by testing all enemies against the map's colliders
+    * deciding which enemies shoot
+
+    BaseEnemy objects only keep their index into the arrays, their `pos`, `vel`, `acc`
+    and `last_shot` read and write the arrays (see `state_vector()`).
+    The vectors are StateVectors, changing them in place, like `enemy.vel.y = 0`,
+    writes the change back into the arrays, the same code works with and without them.
+
+    It is used when ENEMY_ARRAYS is set and numpy is installed.
+
+    Requirements
+    ============
+    * pygame
+    * numpy (optional)
+    * settings
+"""
+
+FIELDS = ("pos_x", "pos_y", "vel_x", "vel_y", "acc_x", "acc_y", "last_shot")
+
+
+class EnemyArrays:
+    """
+    Holds the state of all enemies of a level in arrays.
+
+    Row i belongs to `enemies[i]`, removing an enemy moves the last one into its row.
+    """
+
+    def __init__(self, game, capacity: int = 64):
+        """
+        Parameters
+        ----------
+        game: the game object, its map colliders are used as ground
+        capacity: number of rows allocated at the start, the arrays grow when they are full
+
+        Tests
+        -----
+        * numpy not installed
+        * map without colliders"""
+        self.game = game
+        self.enemies = []
+        self.capacity = 0
+        self.allocate(max(capacity, 1))
+        # the colliders don't move, so they are converted once
+        colliders = np.array(game.map.colliders, np.int64).reshape(-1, 4)
+        self.ground_left = colliders[:, 0]
+        self.ground_top = colliders[:, 1]
+        self.ground_right = colliders[:, 0] + colliders[:, 2]
+        self.ground_bottom = colliders[:, 1] + colliders[:, 3]
+        # the shot timers use their own generator, seeded from random so runs can be repeated
+        self.rng = np.random.default_rng(random.getrandbits(64))
+
+    def allocate(self, capacity: int) -> None:
+        """creates the arrays with room for capacity enemies, keeping the current ones"""
+        count = len(self.enemies)
+        for name in FIELDS:
+            array = np.zeros(capacity, np.int64 if name == "last_shot" else np.float64)
+            if self.capacity:
+                array[:count] = getattr(self, name)[:count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self) -> int:
+        return len(self.enemies)
+
+    def add(self, enemy, x, y) -> int:
+        """adds an enemy at x, y and returns its row
+
+        Tests
+        -----
+        * adding the same enemy twice"""
+        index = len(self.enemies)
+        if index == self.capacity:
+            self.allocate(self.capacity * 2)
+        for name in FIELDS:
+            getattr(self, name)[index] = 0
+        self.pos_x[index] = x
+        self.pos_y[index] = y
+        self.last_shot[index] = self.game.get_ticks()
+        self.enemies.append(enemy)
+        return index
+
+    def remove(self, enemy) -> None:
+        """removes an enemy by moving the last enemy into its row"""
+        index = enemy.index
+        last = len(self.enemies) - 1
+        if index != last:
+            for name in FIELDS:
+                array = getattr(self, name)
+                array[index] = array[last]
+            moved = self.enemies[last]
+            self.enemies[index] = moved
+            moved.index = index
+        self.enemies.pop()
+        enemy.index = None
+
+    def update(self) -> None:
+        """does what `BaseEnemy.update()` does for one enemy, for all enemies.
+
+        Tests
+        -----
+        * no enemies
+        * enemy standing on two platforms"""
+        n = len(self.enemies)
+        if not n:
+            return
+        pos_x, pos_y = self.pos_x[:n], self.pos_y[:n]
+        vel_x, vel_y = self.vel_x[:n], self.vel_y[:n]
+        acc_x, acc_y = self.acc_x[:n], self.acc_y[:n]
+
+        # apply equation of motion
+        acc_x[:] = vel_x * PLAYER_FRICTION
+        acc_y[:] = PLAYER_GRAVITY
+        vel_x += acc_x
+        vel_y += acc_y
+        pos_x += vel_x + 0.5 * acc_x
+        pos_y += vel_y + 0.5 * acc_y
+
+        # rects are placed like pygame does, rounding halves away from zero
+        width, height = self.enemies[0].rect.size
+        centerx = np.copysign(np.floor(np.abs(pos_x) + 0.5), pos_x).astype(np.int64)
+        bottom = np.copysign(np.floor(np.abs(pos_y) + 0.5), pos_y).astype(np.int64)
+        left = centerx - width // 2
+        top = bottom - height
+        for enemy, x, y in zip(self.enemies, left.tolist(), top.tolist()):
+            enemy.rect.topleft = (x, y)
+
+        # land on the last platform that is hit, like the platform loop in BaseEnemy.update()
+        if len(self.ground_top):
+            hits = ((left[:, None] < self.ground_right) & (left[:, None] + width > self.ground_left)
+                    & (top[:, None] < self.ground_bottom) & (bottom[:, None] > self.ground_top))
+            landed = hits.any(axis=1)
+            last_hit = hits.shape[1] - 1 - hits[:, ::-1].argmax(axis=1)
+            pos_y[landed] = self.ground_top[last_hit[landed]] + 1
+            vel_y[landed] = 0
+
+        # shoot when the cooldown is over
+        now = self.game.get_ticks()
+        cooldowns = self.rng.integers(1500, 3000, n, endpoint=True)
+        shooting = np.flatnonzero(now - self.last_shot[:n] > cooldowns)
+        for index in shooting.tolist():
+            self.enemies[index].shot()
+        self.last_shot[shooting] = now
+
+
+class StateVector(pg.math.Vector2):
+    """
+    A copy of an enemy's vector inside the enemy arrays that writes every change back into them.
+
+    Vectors calculated from it, like `enemy.vel * 2` or `enemy.pos.copy()`,
+    are plain copies that don't write back.
+    """
+
+    def __init__(self, enemy, x_name: str, y_name: str):
+        """
+        Parameters
+        ----------
+        enemy: the enemy the vector belongs to, its row is looked up on every write
+        x_name: name of the array of the x value
+        y_name: name of the array of the y value"""
+        super().__init__(float(getattr(enemy.arrays, x_name)[enemy.index]),
+                         float(getattr(enemy.arrays, y_name)[enemy.index]))
+        # set last, so setting it doesn't write back yet
+        self.target = (enemy, x_name, y_name)
+
+    def write_back(self) -> None:
+        """writes the vector into the arrays, does nothing for calculated vectors
+        and enemies that have been removed from the arrays"""
+        target = self.__dict__.get("target")
+        if target is None:
+            return
+        enemy, x_name, y_name = target
+        if enemy.arrays is not None and enemy.index is not None:
+            getattr(enemy.arrays, x_name)[enemy.index] = self[0]
+            getattr(enemy.arrays, y_name)[enemy.index] = self[1]
+
+    def __setattr__(self, name: str, value) -> None:
+        # x, y and swizzles like xy
+        super().__setattr__(name, value)
+        self.write_back()
+
+
+def _write_through(name: str):
+    """returns a method of StateVector that calls the Vector2 method and writes the result back"""
+    method = getattr(pg.math.Vector2, name)
+
+    def write_through(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self.write_back()
+        return result
+    write_through.__name__ = name
+    return write_through
+
+
+# every Vector2 method that changes the vector in place
+for _name in ("__setitem__", "__iadd__", "__isub__", "__imul__", "__itruediv__", "__ifloordiv__",
+              "update", "scale_to_length",
+              *(name for name in dir(pg.math.Vector2) if name.endswith("_ip"))):
+    if hasattr(pg.math.Vector2, _name):
+        setattr(StateVector, _name, _write_through(_name))
+
+
+def state_vector(name: str) -> property:
+    """Returns a property for a vector of an enemy, like pos or vel.
+    It reads and writes the enemy arrays when the enemy has them, as a StateVector,
+    otherwise a Vector2 stored as `_<name>` on the enemy.
+
+    Parameters
+    ----------
+    name: name of the vector, the arrays must have the fields <name>_x and <name>_y"""
+    x_name, y_name, attribute = f"{name}_x", f"{name}_y", f"_{name}"
+
+    def get(enemy) -> pg.math.Vector2:
+        if enemy.arrays is None:
+            return getattr(enemy, attribute)
+        return StateVector(enemy, x_name, y_name)
+
+    def set(enemy, value) -> None:
+        if enemy.arrays is None:
+            setattr(enemy, attribute, pg.math.Vector2(value))
+        else:
+            getattr(enemy.arrays, x_name)[enemy.index] = value[0]
+            getattr(enemy.arrays, y_name)[enemy.index] = value[1]
+
+    return property(get, set, doc=f"{name} of the enemy, stored in the enemy arrays when they are used")
+
+
+def state_value(name: str) -> property:
+    """Like `state_vector()` for a single number, like last_shot."""
+    attribute = f"_{name}"
+
+    def get(enemy):
+        if enemy.arrays is None:
+            return getattr(enemy, attribute)
+        return int(getattr(enemy.arrays, name)[enemy.index])
+
+    def set(enemy, value) -> None:
+        if enemy.arrays is None:
+            setattr(enemy, attribute, value)
+        else:
+            getattr(enemy.arrays, name)[enemy.index] = value
+
+    return property(get, set, doc=f"{name} of the enemy, stored in the enemy arrays when they are used")
@@ -0,0 +1,221 @@
+import argparse
+import os
+import random
+import time
+from typing import Dict, List, Set, Tuple
+
+__doc__ = """
+    Author: Mouaz Tabboush
+
+    headless - Runs the game logic without a window
+    ===============================================
+
+    HeadlessGame runs the game loop with SDL's dummy video and audio drivers.
+    It never draws, doesn't wait for the clock and reads the keys from an InputScript
+    instead of the keyboard, so the game logic runs as fast as the CPU allows.
+    The game time advances by 1/TICK_RATE seconds per update.
+
+    It is meant for load testing levels and measuring how expensive the game logic is:
+
+        python headless.py --level maps/level2.tmx --ticks 10000
+
+    Input scripts
+    =============
+    An input script is a text file where each line has a tick number followed by
+    the names of the keys that are held from that tick on (pygame key names like `a`, `d`, `space`).
+    A line with only a tick number releases all keys. Lines starting with `#` are ignored.
+    The script starts again from the beginning when it reaches its end.
+
+    Requirements
+    ============
+    * pygame
+    * argparse
+    * main
+    * settings
+"""
+
+# must be set before pygame opens a window
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "hide"
+
+import pygame as pg
+
+from main import Game
+from settings import LEVEL1_PATH, TICK_RATE
+from util import print_log
+
+# walks right while jumping and shooting now and then
+DEFAULT_SCRIPT = """
+0 d
+30 d space
+45 d
+60 d k
+62 d
+90 a
+120 a space
+135 a k
+137 a
+180
+200
+"""
+
+
+class ScriptedKeys:
+    """A replacement for the result of `pygame.key.get_pressed()`"""
+    def __init__(self, pressed: Set[int]):
+        """
+        Parameters
+        ----------
+        pressed: key codes of the keys that are held"""
+        self.pressed = pressed
+
+    def __getitem__(self, key_code: int) -> bool:
+        return key_code in self.pressed
+
+
+class InputScript:
+    """Holds which keys are pressed at which tick."""
+    def __init__(self, text: str):
+        """
+        Parameters
+        ----------
+        text: the script, see the description of this module
+
+        Tests
+        -----
+        * passing an unknown key name
+        * passing ticks that are not in order
+        * passing an empty script"""
+        self.steps: List[Tuple[int, Set[int]]] = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            tick, *names = line.split()
+            self.steps.append((int(tick), {pg.key.key_code(name) for name in names}))
+        self.steps.sort(key=lambda step: step[0])
+        # the script is repeated after its last tick
+        self.length = self.steps[-1][0] + 1 if self.steps else 1
+
+    @classmethod
+    def from_file(cls, filename: str) -> "InputScript":
+        """loads an input script from a text file"""
+        with open(filename) as fh:
+            return cls(fh.read())
+
+    def pressed(self, tick: int) -> Set[int]:
+        """returns the keys that are held at a tick
+
+        Parameters
+        ----------
+        tick: number of updates since the start"""
+        tick %= self.length
+        pressed = set()
+        for step_tick, keys in self.steps:
+            if step_tick > tick:
+                break
+            pressed = keys
+        return pressed
+
+
+class HeadlessGame(Game):
+    """
+    A Game that runs its logic as fast as possible without drawing anything.
+    The level is restarted when the player dies, until all ticks are done.
+    """
+    def __init__(self, script: InputScript, ticks: int):
+        """
+        Parameters
+        ----------
+        script: the keys to press
+        ticks: how many updates to run
+
+        Tests
+        -----
+        * passing a negative number of ticks
+        * problem with Game.__init__()"""
+        self.script = script
+        self.ticks = ticks
+        self.tick_count = 0
+        self.restarts = 0
+        self.keys = ScriptedKeys(set())
+        self.elapsed = 0.0
+        super().__init__()
+
+    def get_pressed(self) -> ScriptedKeys:
+        """returns the keys held according to the script"""
+        return self.keys
+
+    def get_ticks(self) -> int:
+        """returns the simulated game time in milliseconds"""
+        return int(self.tick_count * 1000 / TICK_RATE)
+
+    def prefetch_next_map(self) -> None:
+        """levels don't change in a headless run, so nothing is prefetched
+        that could slow down the measured updates"""
+
+    def events(self) -> None:
+        """reads the keys of the current tick from the script and
+        releases the keys that are no longer held."""
+        pressed = self.script.pressed(self.tick_count)
+        for released_key in self.keys.pressed - pressed:
+            self.key_released(released_key)
+        self.keys = ScriptedKeys(pressed)
+
+    def run(self) -> None:
+        """updates the game until all ticks are done or the player died.
+        nothing is drawn and no music is played."""
+        self.playing = True
+        start = time.perf_counter()
+        while self.playing and self.tick_count < self.ticks:
+            self.events()
+            self.update()
+            self.tick_count += 1
+        self.elapsed += time.perf_counter() - start
+
+    def simulate(self) -> Dict[str, float]:
+        """runs all ticks, restarting the level whenever the player dies.
+        returns a report of the run.
+
+        Tests
+        -----
+        * problem with setup()
+        * problem with update()"""
+        while self.tick_count < self.ticks:
+            self.setup()
+            self.run()
+            if self.tick_count < self.ticks:
+                self.restarts += 1
+        return {
+            "ticks": self.tick_count,
+            "seconds": self.elapsed,
+            "ticks_per_second": self.tick_count / self.elapsed if self.elapsed else 0.0,
+            "restarts": self.restarts,
+        }
+
+
+def main() -> None:
+    """parses the command line and runs a headless simulation"""
+    parser = argparse.ArgumentParser(description="Runs the game logic without a window.")
+    parser.add_argument("--level", default=LEVEL1_PATH, help="tmx file of the level to play")
+    parser.add_argument("--ticks", type=int, default=10000, help="number of updates to run")
+    parser.add_argument("--script", help="input script, a built in one is used if missing")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random number generator")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    pg.init()
+    script = InputScript.from_file(args.script) if args.script else InputScript(DEFAULT_SCRIPT)
+    game = HeadlessGame(script, args.ticks)
+    if os.path.abspath(args.level) != os.path.abspath(game.map_name):
+        game.set_map(args.level)
+    report = game.simulate()
+    print_log(f"<headless.main>:{report}", "SUCCESS")
+    print(f"{report['ticks']} ticks in {report['seconds']:.3f}s "
+          f"({report['ticks_per_second']:.0f} ticks per second, {report['restarts']} restarts)")
+    game.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import perf_counter_ns
+from typing import Callable, Dict, List
+
+from settings import ASSET_LOADER_WORKERS
+from util import print_log
+
+__doc__ = """
+    Author: Mouaz Tabboush
+
+    loader - Decodes assets on a thread pool
+    ========================================
+
+    Decoding images and sounds and reading files mostly happens outside of python,
+    so several assets can be decoded at the same time by worker threads.
+    Converting surfaces to the pixel format of the display has to happen on the main thread,
+    so every asset is loaded in two steps:
+
+    * decode: runs on a worker, e.g. `pygame.image.load`
+    * finish: runs on the main thread inside `AssetLoader.wait()`, e.g. `Surface.convert`
+
+    The time each step took is kept for every asset, `report()` logs them.
+
+    Requirements
+    ============
+    * concurrent.futures
+    * settings
+    * util
+"""
+
+
+class AssetLoader:
+    """
+    Loads independent assets at the same time.
+
+    Assets are added with `add()` and are ready once `wait()` returns.
+    With 0 workers every asset is loaded right away inside `add()`.
+    """
+
+    def __init__(self, workers: int = ASSET_LOADER_WORKERS):
+        """
+        Parameters
+        ----------
+        workers: number of worker threads
+
+        Tests
+        -----
+        * passing 0 workers"""
+        self.executor = ThreadPoolExecutor(max_workers=workers) if workers > 0 else None
+        self.pending = {}
+        self.results = {}
+        # decode and finish time in ms by the name of the asset
+        self.timings = {}
+        self.start = perf_counter_ns()
+
+    def add(self, name: str, decode: Callable, *args, finish: Callable = None) -> None:
+        """starts loading an asset
+
+        Parameters
+        ----------
+        name: key of the asset inside the results of `wait()`, must be unique
+        decode: function that is called with args on a worker
+        finish: (optional) function that is called with the result of decode on the main thread,
+                its result is the asset
+
+        Tests
+        -----
+        * adding the same name twice
+        * decode raising an exception"""
+        if self.executor is None:
+            self.finish(name, self.decode(decode, *args), finish)
+        else:
+            self.pending[self.executor.submit(self.decode, decode, *args)] = (name, finish)
+
+    @staticmethod
+    def decode(decode: Callable, *args):
+        """calls decode and returns its result together with how long it took"""
+        start = perf_counter_ns()
+        result = decode(*args)
+        return result, perf_counter_ns() - start
+
+    def finish(self, name: str, decoded, finish: Callable) -> None:
+        """calls finish with a decoded asset and stores the result"""
+        result, decode_time = decoded
+        start = perf_counter_ns()
+        self.results[name] = result if finish is None else finish(result)
+        self.timings[name] = (decode_time / 1e6, (perf_counter_ns() - start) / 1e6)
+
+    def wait(self) -> Dict[str, object]:
+        """finishes every asset as soon as it is decoded and returns all assets by their name.
+        finish functions may add more assets, they are waited for as well.
+        exceptions raised while decoding are raised here.
+
+        Tests
+        -----
+        * calling wait twice"""
+        while self.pending:
+            done, _ = wait(list(self.pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                name, finish = self.pending.pop(future)
+                self.finish(name, future.result(), finish)
+        return self.results
+
+    def report(self) -> List[str]:
+        """logs how long each asset took, the slowest first, and returns the logged lines"""
+        lines = [f"{name}: decode {decode:.1f}ms, finish {finish:.1f}ms"
+                 for name, (decode, finish) in sorted(self.timings.items(),
+                                                      key=lambda item: -sum(item[1]))]
+        lines.append(f"{len(self.timings)} assets loaded in {(perf_counter_ns() - self.start) / 1e6:.1f}ms")
+        for line in lines:
+            print_log(f"<AssetLoader.report>:{line}")
+        return lines
+
+    def shutdown(self) -> None:
+        """stops the worker threads"""
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def read_text(filename: str) -> str:
+    """returns the content of a text file"""
+    with open(filename) as fh:
+        return fh.read()
@@ -6,6 +6,12 @@ from settings import *
 from sprites import *
 from tilemap import *
 from util import *
+from profiler import COLLISION, DRAW, EVENTS, UPDATE, Profiler
+from projectiles import NUMPY_AVAILABLE, ProjectileArrays
+from enemies import EnemyArrays
+from loader import AssetLoader, read_text
+from music import Music
+from textrender import TextEngine
 
 __doc__ = """
     Author: Mouaz Tabboush
@@ -22,11 +28,17 @@ __doc__ = """
     ============
     * pygame
     * os
-    * xml.etree.ElementTree
+    * concurrent.futures
     * settings
     * sprites
     * tilemap
     * util
+    * profiler
+    * projectiles
+    * enemies
+    * loader
+    * music
+    * textrender
     * ./assets
     * ./fonts
     * ./maps
@@ -46,7 +58,8 @@ __doc__ = """
 """
 
 import os
-import xml.etree.ElementTree as ET
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
 
 os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "hide"
 
@@ -63,39 +76,55 @@ class Game:
 
         For holding Spritsheets
         -----------------------
-        - xeon_image_collection: Image_collection 
-        - bullets_spritesheet: Spritesheet
         - healthdrop_spritesheet: Spritesheet
-        - healthdrop_xmldata: ET.ElementTree
         - main_menu_background: Surface
+        - assets: AssetRegistry -> frames that are shared by all sprites of a kind
 
         For holding the Map
         -------------------
+        - map_name: str
         - map: TiledMap
-        - map_image: Surface
+        - map_image: Surface or MapChunks (when MAP_CHUNKED is set)
         - map_rect: Rect
+        - map_loader: ThreadPoolExecutor -> reads prefetched maps
+        - map_prefetches: dict -> maps that are being read in the background by their name
+        - finished_maps: dict -> prefetched maps that are ready for `set_map()` by their name
     
         For holding Sounds
         ------------------
-        - intro_sound:mixer.Sound
-        - platformer_bg_sound:mixer.Sound
+        - music: Music -> streams the intro and level tracks
     
         For controlling the flow
         ------------------------
         - clock: time.Clock
         - playing: bool
         - running: bool
+        - lag: float -> time in ms the game logic is behind the rendered frames
+        - previous_positions: dict -> position of each sprite close to the camera before the last update
+        - visible_sprites: set -> sprites close to the camera before the last update, only kept with CULL_ANIMATIONS
+        - profiler: Profiler -> times the phases of each frame, toggled with F3
+        - text: TextEngine -> caches fonts and rendered texts
+
+        For dirty rect rendering
+        ------------------------
+        - last_camera_offset: tuple
+        - sprite_states: dict -> image and screen rect each sprite was drawn with in the last frame
+        - projectile_rects: list -> screen rects of the projectiles drawn in the last frame
 
         Game Objects
         ------------
         - screen: pg.Surface
-        - all_sprites : sprite.Group
+        - all_sprites : CullingGroup
         - platforms : sprite.Group
+        - platform_grid : SpatialGrid
         - all_physics_objects : sprite.Group
         - coins : sprite.Group
         - player_projectiles : sprite.Group
         - all_enemies : sprite.Group
+        - enemy_arrays : EnemyArrays or None -> state of all enemies when ENEMY_ARRAYS is set
         - enemy_projectiles : sprite.Group
+        - projectile_pool : ProjectilePool
+        - projectile_arrays : ProjectileArrays or None -> used instead of the pool when PROJECTILE_ARRAYS is set
         - camera : Camera
         - player : Player
 
@@ -107,13 +136,33 @@ class Game:
     -------
     - load_data()
     - load_map()
+    - finish_map()
+    - prefetch_map()
+    - finish_prefetched_maps()
     - set_map()
+    - prefetch_next_map()
     - new()
+    - setup()
     - run()
+    - tick()
     - update()
+    - update_sprites()
+    - check_collisions()
+    - spawn_projectile()
+    - projectile_blits()
     - events()
+    - key_released()
+    - get_pressed()
+    - get_ticks()
     - draw()
+    - culling_rect()
+    - is_visible()
+    - screen_rect()
+    - draw_map()
+    - sprite_blits()
+    - draw_dirty()
     - draw_text()
+    - draw_glyphs()
     - show_start_screen()
     - show_over_screen()
     - scroll_text()
@@ -122,35 +171,49 @@ class Game:
     - quit()
     """
     # type definitions for asset variables
-    xeon_image_collection: ImageCollection
-    bullets_spritesheet: Spritesheet
     healthdrop_spritesheet: Spritesheet
-    healthdrop_xmldata: ET.ElementTree
     main_menu_background: Surface
+    assets: AssetRegistry
+    map_name: str
     map: TiledMap
-    map_image: Surface
+    map_image: Union[Surface, MapChunks]
     map_rect: Rect
-    intro_sound:mixer.Sound
-    platformer_bg_sound:mixer.Sound
+    map_loader: ThreadPoolExecutor
+    map_prefetches: Dict[str, Future]
+    finished_maps: Dict[str, Tuple[TiledMap, Union[Surface, MapChunks], Rect]]
+    music: Music
 
     # type definitions for pygame objects
     screen: pg.Surface
     clock: time.Clock
 
     # type definitions for logic objects
-    all_sprites : sprite.Group
+    all_sprites : CullingGroup
     platforms : sprite.Group
+    platform_grid : SpatialGrid
     all_physics_objects : sprite.Group
     coins : sprite.Group
     player_projectiles : sprite.Group
     all_enemies : sprite.Group
+    enemy_arrays : Optional[EnemyArrays]
     enemy_projectiles : sprite.Group
+    projectile_pool : ProjectilePool
+    projectile_arrays : Optional[ProjectileArrays]
     camera : Camera
     player : Player
 
     # type definitions for flow control variabales
     playing: bool
     running: bool
+    lag: float
+    previous_positions: Dict[sprite.Sprite, Tuple[int, int]]
+    visible_sprites: Set[sprite.Sprite]
+    profiler: Profiler
+
+    # type definitions for dirty rect rendering
+    last_camera_offset: Tuple[int, int]
+    sprite_states: Dict[sprite.Sprite, Tuple[Surface, Rect]]
+    projectile_rects: List[Rect]
 
     # other
     intro_text: str
@@ -165,12 +228,26 @@ class Game:
         * pygame not imported
         * problem with load_data()"""
         print_log("STARTING PYGAME", "STARTUP")
+        # the buffer has to be set before the mixer is started by pg.init()
+        mixer.pre_init(buffer=MIXER_BUFFER)
         pg.init()
         mixer.init()
+        self.music = Music()
+        self.text = TextEngine()
         self.screen = pg.display.set_mode((WIDTH, HEIGHT))
         pg.display.set_caption(TITLE)
         self.clock = time.Clock()
         self.running = True
+        # maps are read on a single worker so they don't compete with each other,
+        # they are finished on this thread between two frames
+        self.map_loader = ThreadPoolExecutor(max_workers=1)
+        self.map_prefetches = {}
+        self.finished_maps = {}
+        self.profiler = Profiler()
+        if PROJECTILE_ARRAYS and not NUMPY_AVAILABLE:
+            print_log("<game.__init__>:PROJECTILE_ARRAYS needs numpy, using projectile sprites instead", "WARNING")
+        if ENEMY_ARRAYS and not NUMPY_AVAILABLE:
+            print_log("<game.__init__>:ENEMY_ARRAYS needs numpy, updating enemies one by one instead", "WARNING")
         self.load_data()
 
     @debug
@@ -183,42 +260,62 @@ class Game:
         * print_log() not defined
         * problem creating Spritesheets
         * problem creating Image_collections"""
-        # load Xeon Spritesheet
+        # independent assets are decoded at the same time,
+        # the convert() calls that need the display run on this thread
         print_log("<game.run>:LOADING ASSETS...")
-        print_log("<game.run>:LOADING PLAYER SPRITESHEET")
-        self.xeon_image_collection = ImageCollection(XEON_FRAMES)
-
-        print_log("<game.run>:LOADING BULLETS SPRITESHEET")
-        self.bullets_spritesheet = Spritesheet(BULLETS_SPRITESHEET)
+        loader = AssetLoader()
 
         print_log("<game.run>:LOADING HEALTHDROP SPRITESHEET")
-        self.healthdrop_spritesheet = Spritesheet(HEALTHDROP_SPRITESHEET)
-        self.healthdrop_xmldata = ET.parse(HEALTHDROP_XML_DATA)
+        loader.add("healthdrop_spritesheet", Spritesheet.decode, HEALTHDROP_SPRITESHEET, HEALTHDROP_XML_DATA,
+                   finish=lambda decoded: Spritesheet(HEALTHDROP_SPRITESHEET, *decoded, colorkey=BLACK))
 
         # load menu background
         print_log("<game.run>:LOADING BACKGROUND IMAGE SPRITESHEET")
-        self.main_menu_background = pg.image.load(MAIN_MENU_BG).convert()
+        loader.add("main_menu_background", pg.image.load, MAIN_MENU_BG, finish=Surface.convert)
 
         # load map
         print_log("<game.run>:LOADING MAP")
-        self.map, self.map_image, self.map_rect = self.load_map(LEVEL1_PATH)
-
-        # load sounds
-        print_log("<game.run>:LOADING SOUNDS")
-        self.intro_sound = mixer.Sound(INTRO_SOUND_PATH)
-        self.platformer_bg_sound = mixer.Sound(PLATFORMER_BG_SOUND_PATH)
+        # the level is read or compiled on a worker, its tiles are loaded and baked on this thread
+        loader.add("map", TiledMap, LEVEL1_PATH, finish=self.finish_map)
 
         print_log("<game.run>:LOADING INTRO TEXT")
-        with open(INTRO_TEXT) as fh:
-            self.intro_text = fh.read()
+        loader.add("intro_text", read_text, INTRO_TEXT)
+
+        assets = loader.wait()
+        loader.shutdown()
+        loader.report()
+        self.healthdrop_spritesheet = assets["healthdrop_spritesheet"]
+        self.main_menu_background = assets["main_menu_background"]
+        self.map_name = LEVEL1_PATH
+        self.map, self.map_image, self.map_rect = assets["map"]
+        self.intro_text = assets["intro_text"]
+
+        # build the frames of every sprite once, instead of once per sprite
+        print_log("<game.run>:BUILDING SPRITE FRAMES")
+        self.assets = AssetRegistry(self)
+        # assets with sources are cached, see AssetRegistry.
+        # the player and projectile frames are baked by bake.py, their sheets are only loaded when the bake is outdated
+        self.assets.register_baked()
+        self.assets.register("healthdrop", HealthDrop.build_frames,
+                             (HEALTHDROP_SPRITESHEET, HEALTHDROP_XML_DATA),
+                             (self.healthdrop_spritesheet.scale, self.healthdrop_spritesheet.colorkey,
+                              Spritesheet))
+        self.assets.register("base_enemy", BaseEnemy.build_image, (BASE_ENEMY_IMAGE,),
+                             (BASE_ENEMY_KEYCOLOR,))
+        # the animations are built from the frames above
+        self.assets.register("player_animations", Player.build_animations)
+        self.assets.register("projectile_animations", Projectile.build_animations)
+        self.assets.register("healthdrop_animation", HealthDrop.build_animation)
+        self.assets.preload()
 
         print_log("<game.run>:ASSETS LOADED SUCCESSFULLY", "SUCCESS")
 
     @debug
-    def load_map(self, mapName) -> Tuple[TiledMap, Surface, Rect]:
+    def load_map(self, mapName) -> Tuple[TiledMap, Union[Surface, MapChunks], Rect]:
         """Loads a map by providing the map's name.
 
         The map needs to be inside the ./maps folder and has to be a valid tmx file.
+        When MAP_CHUNKED is set the map is returned as MapChunks instead of one big surface.
         
         Tests
         -----
@@ -226,11 +323,54 @@ class Game:
         * mapName invalid
         * mapName doesn't exist
         """
-        new_map = TiledMap(mapName)
-        map_image = new_map.make_map()
+        return self.finish_map(TiledMap(mapName))
+
+    @debug
+    def finish_map(self, new_map: TiledMap) -> Tuple[TiledMap, Union[Surface, MapChunks], Rect]:
+        """Builds the image of a map that has been read with `TiledMap()`.
+        Loading the tile images, baking and rendering need the display,
+        so this has to run on the main thread, while the map can be read on a worker.
+
+        Tests
+        -----
+        * problem with make_chunks()
+        * problem with make_map()"""
+        if MAP_CHUNKED:
+            map_image = new_map.make_chunks()
+        else:
+            map_image = new_map.make_map()
         map_rect = map_image.get_rect()
         return new_map, map_image, map_rect
 
+    @debug
+    def prefetch_map(self, mapName) -> None:
+        """starts reading a map on the map loader's worker, so `set_map()` doesn't have to wait for it.
+        only the map data is read there, the map is finished by `finish_prefetched_maps()`.
+        Does nothing if the map is the current one or already prefetched.
+
+        Tests
+        -----
+        * mapName invalid
+        * problem with TiledMap() inside the worker thread"""
+        if mapName == self.map_name or mapName in self.map_prefetches or mapName in self.finished_maps:
+            return
+        print_log(f"<game.prefetch_map>:prefetching {os.path.basename(mapName)}")
+        self.map_prefetches[mapName] = self.map_loader.submit(TiledMap, mapName)
+
+    def finish_prefetched_maps(self) -> None:
+        """finishes the maps the worker has read, see `finish_map()`.
+        called between two frames, because finishing loads tile images and may bake the map.
+        a map that failed to load is dropped, `set_map()` loads it again and raises its error."""
+        for mapName, prefetch in list(self.map_prefetches.items()):
+            if not prefetch.done():
+                continue
+            del self.map_prefetches[mapName]
+            try:
+                self.finished_maps[mapName] = self.finish_map(prefetch.result())
+            except Exception as error:
+                print_log(f"<game.finish_prefetched_maps>:can't prefetch {os.path.basename(mapName)} ({error})",
+                          "WARNING")
+
     @debug
     def set_map(self, mapName):
         """changes the game map.
@@ -241,15 +381,43 @@ class Game:
         * print_log not defined
         * problem with load_map()
         * mapName not a string"""
-        print_log("<game.change_map>:loading a new map")
-        self.map, self.map_image, self.map_rect = self.load_map(mapName)
+        prefetch = self.map_prefetches.pop(mapName, None)
+        if prefetch is not None:
+            print_log("<game.change_map>:waiting for the prefetched map", "WARNING")
+            self.finished_maps[mapName] = self.finish_map(prefetch.result())
+        new_map = self.finished_maps.pop(mapName, None)
+        if new_map is None:
+            print_log("<game.change_map>:loading a new map")
+            new_map = self.load_map(mapName)
+        self.map_name = mapName
+        self.map, self.map_image, self.map_rect = new_map
         print_log("<game.change_map>:loaded the new map Successfully","SUCCESS")
 
+    def prefetch_next_map(self) -> None:
+        """prefetches the level that comes after the current one in LEVELS, if there is one"""
+        if PREFETCH_NEXT_LEVEL and self.map_name in LEVELS:
+            index = LEVELS.index(self.map_name)
+            if index + 1 < len(LEVELS):
+                self.prefetch_map(LEVELS[index + 1])
+
     @debug
     def new(self) -> None:
         """runs code that starts a new game.
+        Rebuilds released sprite frames first, so spawning sprites while playing
+        never has to build them.
+
+        Tests
+        -----
+        * problem with setup()
+        * problem with run()
+        """
+        self.assets.preload()
+        self.setup()
+        self.run()
 
-        This method sets up all objects in the current <game.map:TiledMap>
+    @debug
+    def setup(self) -> None:
+        """sets up all objects in the current <game.map:TiledMap>
 
         Tests
         -----
@@ -262,7 +430,8 @@ class Game:
 
         print_log("<game.new>:SETTING UP GROUPS")
         # start the game
-        self.all_sprites = sprite.Group()
+        # sprites are drawn through the grid of all_sprites, so only the ones close to the camera are drawn
+        self.all_sprites = CullingGroup()
         self.platforms = sprite.Group()
         self.all_physics_objects = sprite.Group()
         self.coins = sprite.Group()
@@ -273,6 +442,15 @@ class Game:
         # new camera
         print_log("<game.new>:SETTING UP CAMERA")
         self.camera = Camera(self.map.width, self.map.height)
+        # forces a full redraw on the first frame
+        self.last_camera_offset = None
+        self.sprite_states = {}
+        self.projectile_rects = []
+        self.previous_positions = {}
+        self.visible_sprites = set()
+
+        # enemies add themselves to the arrays when they are created
+        self.enemy_arrays = EnemyArrays(self) if ENEMY_ARRAYS and NUMPY_AVAILABLE else None
 
         # create tile objects
         print_log("<game.new>:LOADING OBJECTS FROM THE MAP")
@@ -280,10 +458,6 @@ class Game:
             if tile_object.name == "player":
                 self.player = Player(self, tile_object.x, tile_object.y)
                 self.all_sprites.add(self.player)
-            if tile_object.name == "platform":
-                p = TiledPlatform(self, tile_object.x, tile_object.y,
-                                  tile_object.width, tile_object.height)
-                self.platforms.add(p)
             if tile_object.name == "coin":
                 c = HealthDrop(self, tile_object.x, tile_object.y)
                 self.all_sprites.add(c)
@@ -294,30 +468,77 @@ class Game:
                 self.all_enemies.add(e)
                 self.all_physics_objects.add(e)
 
+        # shots reuse the projectiles of the pool
+        self.projectile_pool = ProjectilePool(self)
+        self.projectile_arrays = ProjectileArrays(self) \
+            if PROJECTILE_ARRAYS and NUMPY_AVAILABLE else None
+
+        # platforms are created from the (merged) colliders of the map
+        for x, y, w, h in self.map.colliders:
+            self.platforms.add(TiledPlatform(self, x, y, w, h))
+
+        # platforms don't move, so they are only sorted into the grid once
+        self.platform_grid = SpatialGrid()
+        self.platform_grid.add(*self.platforms)
+
         print_log("<game.new>:FINNISHED LOADING OBJECTS", "SUCCESS")
-        self.run()
+        self.prefetch_next_map()
 
     @debug
     def run(self) -> None:
         """A function that controls the main game loop.
         Doesn't return anything.
 
+        The game logic is updated in fixed steps of 1/TICK_RATE seconds.
+        Each frame runs as many steps as have passed since the last frame,
+        and draws the sprites between their last two positions.
+        The phases of every frame are timed by the profiler.
+
         Tests
         -----
         * Missing gloable variables
         * missing local variables of the object
-        * platformer_bg_sound not imported correctly
+        * PLATFORMER_BG_SOUND_PATH missing
         """
         self.playing = True
         if MUSIC_ON:
-            self.platformer_bg_sound.play()
-            self.platformer_bg_sound.set_volume(MASTER_SOUND)
+            # the intro track fades out, then this one fades in
+            self.music.play(PLATFORMER_BG_SOUND_PATH)
+        tick_time = 1000 / TICK_RATE
+        self.lag = 0.0
         while self.playing:
-            self.clock.tick(FPS)
+            self.lag += self.clock.tick(FPS)
+            self.profiler.begin_frame()
             self.events()
-            self.update()
-            self.draw()
-        self.platformer_bg_sound.fadeout(1000)
+            self.profiler.mark(EVENTS)
+            ticks = 0
+            while self.lag >= tick_time and self.playing:
+                self.tick()
+                self.lag -= tick_time
+                ticks += 1
+                if ticks == MAX_TICKS_PER_FRAME:
+                    # drop the time that can't be caught up with
+                    self.lag = 0.0
+            self.draw(self.lag / tick_time)
+            self.profiler.mark(DRAW)
+            self.profiler.end_frame()
+            if self.map_prefetches:
+                self.finish_prefetched_maps()
+        self.music.fadeout(1000)
+
+    @debug
+    def tick(self) -> None:
+        """Runs one fixed step of the game logic.
+        Remembers the positions of the sprites close to the camera before the update,
+        so they can be interpolated.
+
+        Tests
+        -----
+        * problem with update()"""
+        if INTERPOLATE:
+            self.previous_positions = {sprite: sprite.rect.topleft
+                                       for sprite in self.all_sprites.sprites_in(self.culling_rect())}
+        self.update()
 
 
     def update(self) -> None:
@@ -327,18 +548,54 @@ class Game:
         
         Tests
         -----
-        * problem with update() of a sprite
-        * problem with camera.update where player doesnt have a rect
+        * problem with update_sprites()
+        * problem with check_collisions()
         * print_log undefined
-        * sprite from pygame not imported
         """
+        self.update_sprites()
+        self.profiler.mark(UPDATE)
+        self.check_collisions()
+        self.profiler.mark(COLLISION)
 
+        # Game Over
+        if self.player.rect.bottom > self.camera.height\
+                or self.player.health < 10:
+            self.playing = False
+            print_log("<game.update>:Game Over")
+            print_log(f"<game.update>:projectile pool {self.projectile_pool.metrics()}")
+
+    @debug
+    def update_sprites(self) -> None:
+        """Updates the logic of every sprite and moves the camera.
+
+        Tests
+        -----
+        * problem with update() of a sprite
+        * problem with camera.update where player doesnt have a rect"""
+        if CULL_ANIMATIONS:
+            # sprites outside of the camera skip their animation, see `is_visible()`
+            self.visible_sprites = set(self.all_sprites.sprites_in(self.culling_rect()))
         # Update objects logic
+        # projectile arrays are moved first, so shots fired during this update
+        # only start moving with the next one, like projectile sprites
+        if self.projectile_arrays is not None:
+            self.projectile_arrays.update()
         self.all_sprites.update()
+        if self.enemy_arrays is not None:
+            self.enemy_arrays.update()
+        self.all_sprites.update_grid()
 
         # Make the camera follow the player
         self.camera.update(self.player)
 
+    @debug
+    def check_collisions(self) -> None:
+        """Handles collisions between the player, coins, enemies and projectiles.
+
+        Tests
+        -----
+        * print_log undefined
+        * sprite from pygame not imported"""
         # Player Coin Collecting
         coin_hits = sprite.spritecollide(self.player,
                                          self.coins,
@@ -348,6 +605,10 @@ class Game:
             self.player.health += 10
             print_log("<game.update>:Player Collected a coin")
 
+        if self.projectile_arrays is not None:
+            self.projectile_arrays.check_collisions()
+            return
+
         # Player getting shot
         player_hits = sprite.spritecollide(self.player,
                                            self.enemy_projectiles,
@@ -370,13 +631,29 @@ class Game:
                 enemy_sprite.die()
                 print_log("<game.update>:Enemy Killed")
 
-        # Game Over
-        if self.player.rect.bottom > self.camera.height\
-                or self.player.health < 10:
-            self.playing = False
-            print_log("<game.update>:Game Over")
+    def spawn_projectile(self, x, y, x_vel, facing_right, shooter) -> None:
+        """Fires a projectile, takes the same parameters as `Projectile.__init__()`.
+        The projectile is added to the projectile arrays when they are used,
+        otherwise it is taken from the pool and added to the group of the shooter's projectiles.
+
+        Tests
+        -----
+        * shooter that is neither the player nor an enemy"""
+        if self.projectile_arrays is not None:
+            self.projectile_arrays.spawn(x, y, x_vel, facing_right, shooter)
+        elif shooter is self.player:
+            self.projectile_pool.spawn(x, y, x_vel, facing_right, shooter, self.player_projectiles)
+        else:
+            self.projectile_pool.spawn(x, y, x_vel, facing_right, shooter, self.enemy_projectiles)
 
+    def projectile_blits(self, alpha: float = 1.0) -> list:
+        """Returns (image, rect) pairs of the projectile arrays for `Surface.blits()`,
+        empty when projectiles are sprites."""
+        if self.projectile_arrays is None:
+            return []
+        return self.projectile_arrays.blit_list(self.camera, alpha if INTERPOLATE else 1.0)
 
+    @debug
     def events(self):
         """Method for controlling the event loop.
         
@@ -392,14 +669,52 @@ class Game:
                 self.running = False
 
             if event.type == pg.KEYUP:
-                if event.key == pg.K_SPACE:
-                    self.player.jump_cut()
-                if event.key == pg.K_k:
-                    self.player.shooting_locked = False
+                self.key_released(event.key)
+
+            self.music.handle_event(event)
+
+    def key_released(self, released_key: int) -> None:
+        """Reacts to a key being released.
+
+        Parameters
+        ----------
+        released_key: the pygame key code of the released key
 
-    def draw(self) -> None:
+        Tests
+        -----
+        * player missing jump_cut() function"""
+        if released_key == pg.K_SPACE:
+            self.player.jump_cut()
+        if released_key == pg.K_k:
+            self.player.shooting_locked = False
+        if released_key == pg.K_F3:
+            self.profiler.toggle()
+        if released_key == pg.K_F4:
+            self.profiler.export_csv(PROFILER_CSV)
+            print_log(f"<game.key_released>:Saved profile to {PROFILER_CSV}", "SUCCESS")
+
+    def get_pressed(self):
+        """Returns the state of every key, like `pygame.key.get_pressed()`.
+        Sprites use this instead of pygame directly, so the input can be replaced."""
+        return pg.key.get_pressed()
+
+    def get_ticks(self) -> int:
+        """Returns the game time in milliseconds, like `pygame.time.get_ticks()`.
+        Sprites use this instead of pygame directly, so the time can be replaced."""
+        return pg.time.get_ticks()
+
+    @debug
+    def draw(self, alpha: float = 1.0) -> None:
         """ Method for drawing graphics.
-        applies the camera's offset and showing the player health bar
+        applies the camera's offset and showing the player health bar.
+
+        When DIRTY_RECTS is set and the camera has not moved since the last frame,
+        only the areas under the sprites are redrawn. see `draw_dirty()`
+        The whole screen is always redrawn while the profiler overlay is shown.
+
+        Parameters
+        ----------
+        alpha: how far the frame is between the last two updates, see `screen_rect()`
 
         Tests
         -----
@@ -408,17 +723,151 @@ class Game:
         * camera not able to apply offest to a sprite
         """
         # Game Loop - Draw
-        self.screen.fill(BG_COLOR) # might be redundant
-        self.screen.blit(self.map_image, self.camera.apply(self.map_rect))
+        if INTERPOLATE:
+            self.camera.interpolate(alpha)
+        if DIRTY_RECTS and self.camera.offset == self.last_camera_offset\
+                and not self.profiler.visible:
+            self.draw_dirty(alpha)
+            return
 
-        for sprite in self.all_sprites:
-            self.screen.blit(sprite.image, self.camera.apply(sprite))
-
-        self.screen.blit(self.player.image, self.camera.apply(self.player))
+        self.screen.fill(BG_COLOR) # might be redundant
+        self.draw_map()
+
+        sprite_blits = self.sprite_blits(alpha)
+        self.screen.blits(list(sprite_blits.values()), False)
+        projectile_blits = self.projectile_blits(alpha)
+        self.screen.blits(projectile_blits, False)
+        # the player is drawn last, on top of everything else
+        player_blit = (self.player.image, self.screen_rect(self.player, alpha))
+        self.screen.blit(*player_blit)
+
+        if self.profiler.visible:
+            self.profiler.draw_overlay(self.screen)
         ## after everything ##
         pg.display.flip()
+        self.last_camera_offset = self.camera.offset
+        self.sprite_states = sprite_blits
+        self.sprite_states[self.player] = player_blit
+        self.projectile_rects = [image.get_rect(topleft=rect.topleft) for image, rect in projectile_blits]
 
+    def sprite_blits(self, alpha: float = 1.0) -> Dict[sprite.Sprite, Tuple[Surface, Rect]]:
+        """Returns the image and screen rect of every sprite on the screen except the player,
+        in the order they are drawn.
 
+        Parameters
+        ----------
+        alpha: how far the frame is between the last two updates, see `screen_rect()`"""
+        screen_rect = self.screen.get_rect()
+        blits = {}
+        for sprite in self.all_sprites.sprites_in(self.culling_rect()):
+            if sprite is self.player:
+                continue
+            rect = self.screen_rect(sprite, alpha)
+            if rect.colliderect(screen_rect):
+                blits[sprite] = (sprite.image, rect)
+        return blits
+
+    def culling_rect(self) -> Rect:
+        """Returns the part of the map in which sprites are drawn:
+        the view of the camera with CULLING_MARGIN around it,
+        so sprites that are drawn between two positions are not cut off."""
+        return self.camera.view_rect.inflate(2 * CULLING_MARGIN, 2 * CULLING_MARGIN)
+
+    def is_visible(self, sprite: sprite.Sprite) -> bool:
+        """Returns if a sprite was close to the camera before the last update.
+        Always true without CULL_ANIMATIONS, sprites use this to skip their animation."""
+        return not CULL_ANIMATIONS or sprite in self.visible_sprites
+
+    def screen_rect(self, sprite: sprite.Sprite, alpha: float = 1.0) -> Rect:
+        """Returns where a sprite is drawn on the screen.
+        With INTERPOLATE the sprite is placed between its position before and after the last update.
+
+        Parameters
+        ----------
+        sprite: the sprite to be drawn
+        alpha: 0.0 for the position before the last update, 1.0 for the current position
+
+        Tests
+        -----
+        * sprite without a rect
+        * sprite that was created during the last update"""
+        rect = self.camera.apply(sprite)
+        previous = self.previous_positions.get(sprite) if INTERPOLATE else None
+        if previous is not None:
+            x, y = sprite.rect.topleft
+            rect.move_ip(round((previous[0] - x) * (1 - alpha)),
+                         round((previous[1] - y) * (1 - alpha)))
+        return rect
+
+    def draw_map(self) -> None:
+        """Draws the map with the camera's offset on the screen.
+
+        Tests
+        -----
+        * map_image not loaded
+        * camera not able to apply offest to map"""
+        if MAP_CHUNKED:
+            self.map_image.draw(self.screen, self.camera)
+        else:
+            self.screen.blit(self.map_image, self.camera.apply(self.map_rect))
+
+    def draw_dirty(self, alpha: float = 1.0) -> None:
+        """Redraws only the parts of the screen that changed since the last frame.
+        A sprite is dirty when its screen rect or image changed, when it appeared or when
+        it was killed or left the screen. Projectiles are always dirty.
+        The background and every sprite touching a dirty rect are redrawn inside of it
+        and only the dirty rects are pushed to the display.
+
+        This only works while the camera is still, `draw()` falls back to a full redraw otherwise.
+
+        Parameters
+        ----------
+        alpha: how far the frame is between the last two updates, see `screen_rect()`
+
+        Tests
+        -----
+        * sprite_states missing because draw() was never called
+        * sprites without a rect"""
+        screen_rect = self.screen.get_rect()
+        sprite_blits = self.sprite_blits(alpha)
+        player_blit = (self.player.image, self.screen_rect(self.player, alpha))
+        projectile_blits = self.projectile_blits(alpha)
+        projectile_rects = [image.get_rect(topleft=rect.topleft) for image, rect in projectile_blits]
+        sprite_states = dict(sprite_blits)
+        sprite_states[self.player] = player_blit
+
+        # images can be bigger than the rects of their sprites, so the area of the image is used
+        def area(blit):
+            image, rect = blit
+            return image.get_rect(topleft=rect.topleft)
+
+        dirty_rects = []
+        for entity, blit in sprite_states.items():
+            old = self.sprite_states.pop(entity, None)
+            if old is None:
+                dirty_rects.append(area(blit))
+            elif old[0] is not blit[0] or old[1] != blit[1]:
+                dirty_rects.append(area(old))
+                dirty_rects.append(area(blit))
+        # the sprites that are left were killed or left the screen
+        dirty_rects.extend(area(old) for old in self.sprite_states.values())
+        dirty_rects.extend(self.projectile_rects)
+        dirty_rects.extend(projectile_rects)
+        dirty_rects = [rect.clip(screen_rect) for rect in dirty_rects]
+
+        # everything is redrawn inside the dirty rects, in the same order as draw()
+        blits = list(sprite_blits.values()) + projectile_blits + [player_blit]
+        blit_rects = [area(blit) for blit in blits]
+        for rect in dirty_rects:
+            self.screen.set_clip(rect)
+            self.screen.fill(BG_COLOR)
+            self.draw_map()
+            self.screen.blits([blits[index] for index in rect.collidelistall(blit_rects)], False)
+        self.screen.set_clip(None)
+
+        pg.display.update(dirty_rects)
+        self.sprite_states = sprite_states
+        self.projectile_rects = projectile_rects
 
     def draw_text(self, text, size: int, color: Tuple[tuple, tuple], x: int, y: int, surface: pg.surface.Surface = None) -> Tuple[Surface, Rect]:
         """A method that draws a text of a surface or the main screen.
@@ -440,22 +889,8 @@ class Game:
         - passing negative size
         - passing very large size
         """
-        # get the two arcade fonts
-        font_in = pg.font.Font(FONT_ARCADE_IN, size)
-        font_out = pg.font.Font(FONT_ARCADE_OUT, size)
-
-        # render them to get two surfaces
-        text_in_surface: Surface = font_in.render(str(text), True, color[0])
-        text_out_surface: Surface = font_out.render(str(text), True, color[1])
-        text_in_rect: Rect = text_in_surface.get_rect()
-        text_out_rect: Rect = text_out_surface.get_rect()
-        text_in_rect.topleft = (0, 0)
-        text_out_rect.topleft = (0, 0)
-
-        # create a final surface and blit the two surfaces on it
-        text_surface = Surface(text_in_surface.get_size())
-        text_surface.blit(text_in_surface, text_in_rect)
-        text_surface.blit(text_out_surface, text_out_rect)
+        # the two arcade fonts rendered over each other, only rendered again for new texts
+        text_surface = self.text.render(str(text), size, color)
 
         # change position to match given x and y
         text_surface_rect = text_surface.get_rect()
@@ -471,6 +906,25 @@ class Game:
         # return the text_surface so you dont have to draw it again.
         return text_surface, text_surface_rect
 
+    def draw_glyphs(self, text, size: int, color: Tuple[tuple, tuple], x: int, y: int, surface: pg.surface.Surface = None) -> Rect:
+        """Draws a text like `draw_text()`, but from a glyph atlas
+        that has every character rendered once. Meant for text that changes every frame,
+        like counters, where caching the rendered text doesn't help.
+
+        Parameters
+        ----------
+        the same as `draw_text()`
+
+        Returns the rect the text covers.
+
+        Tests
+        -----
+        - passing characters that are not in the atlas
+        """
+        if surface is None:
+            surface = self.screen
+        return self.text.glyphs(size, color).draw(surface, str(text), x, y)
+
     @debug
     def show_start_screen(self) -> None:
         """method that describes how the start screen looks like
@@ -481,8 +935,7 @@ class Game:
         * missing local variables of the object
         * problem with draw_text() or blit()"""
         if MUSIC_ON:
-            self.intro_sound.play()
-            self.intro_sound.set_volume(MASTER_SOUND)
+            self.music.play(INTRO_SOUND_PATH)
         self.screen.blit(self.main_menu_background,
                          self.main_menu_background.get_rect())
 
@@ -505,7 +958,6 @@ class Game:
         text = self.intro_text
         print_log("STARTED INTRO")
         self.scroll_text(text)
-        self.intro_sound.fadeout(1000)
         self.clock.tick(2)
         print_log("FINNISHED INTRO")
 
@@ -627,7 +1079,12 @@ class Game:
         * pygame not imported as pg
         """
         # Close Game
+        self.map_loader.shutdown(wait=False)
+        self.assets.release()
+        self.music.stop()
         pg.quit()
+        export_trace()
+        flush_log()
 
 if __name__ == "__main__":
     g = Game()
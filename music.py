@@ -0,0 +1,110 @@
+import pygame as pg
+from pygame import mixer
+
+from settings import MASTER_SOUND, MUSIC_FADE_TIME
+from util import print_log
+
+__doc__ = """
+    Author: Mouaz Tabboush
+
+    music - Streams the background music from disk
+    ==============================================
+
+    Long tracks are played with `pygame.mixer.music`, which decodes them in small buffers
+    while they play, instead of decoding the whole track into memory like `mixer.Sound`.
+    Short sound effects should still be loaded as `mixer.Sound`, so they can start without delay.
+
+    mixer.music can only play one track at a time, so switching tracks fades out
+    the current one first. mixer.music posts MUSIC_END when the fade out is over,
+    `Music.handle_event()` then fades in the next track. The game passes every event to it.
+
+    The size of the mixer buffer is set with MIXER_BUFFER in settings.py,
+    smaller buffers lower the audio latency but can make the sound crackle on slow machines.
+
+    Requirements
+    ============
+    * pygame
+    * settings
+    * util
+"""
+
+
+# posted by mixer.music when a track ends or has faded out
+MUSIC_END = pg.event.custom_type()
+
+
+class Music:
+    """
+    Plays one streamed track at a time and switches between tracks.
+    """
+
+    def __init__(self, volume: float = MASTER_SOUND):
+        """
+        Parameters
+        ----------
+        volume: volume of the music, between 0.0 and 1.0
+
+        Tests
+        -----
+        * mixer not initialized"""
+        self.volume = volume
+        self.track = None
+        # the track that fades in when the current one has faded out, with its loops and fade time
+        self.next_track = None
+
+    def play(self, filename: str, fade_time: int = MUSIC_FADE_TIME, loops: int = -1) -> None:
+        """starts streaming a track and fades it in.
+        if a track is playing it is faded out first, the new one fades in once `handle_event()` gets MUSIC_END.
+        does nothing if the track is already playing.
+
+        Parameters
+        ----------
+        filename: path of the track, ogg and mp3 are supported
+        fade_time: how long the old track fades out and the new one fades in, in ms
+        loops: how often the track is repeated, -1 repeats it forever
+
+        Tests
+        -----
+        * file doesn't exist
+        * calling play twice with the same track"""
+        if filename == self.track and mixer.music.get_busy():
+            return
+        print_log(f"<Music.play>:streaming {filename[-30:]}")
+        self.track = filename
+        if mixer.music.get_busy():
+            if self.next_track is None:
+                mixer.music.set_endevent(MUSIC_END)
+                mixer.music.fadeout(fade_time)
+            self.next_track = filename, loops, fade_time
+        else:
+            self.start(filename, loops, fade_time)
+
+    def start(self, filename: str, loops: int, fade_time: int) -> None:
+        """loads a track and fades it in, nothing may be playing"""
+        self.next_track = None
+        mixer.music.set_endevent()
+        mixer.music.set_volume(self.volume)
+        mixer.music.load(filename)
+        mixer.music.play(loops, fade_ms=fade_time)
+
+    def handle_event(self, event: pg.event.Event) -> None:
+        """starts the next track once the old one has faded out, see `play()`
+
+        Parameters
+        ----------
+        event: any event of the event queue"""
+        if event.type == MUSIC_END and self.next_track is not None:
+            self.start(*self.next_track)
+
+    def fadeout(self, fade_time: int = MUSIC_FADE_TIME) -> None:
+        """fades out the track that is playing"""
+        self.track = None
+        self.next_track = None
+        mixer.music.fadeout(fade_time)
+
+    def stop(self) -> None:
+        """stops the music and closes the track"""
+        self.track = None
+        self.next_track = None
+        mixer.music.stop()
+        mixer.music.unload()
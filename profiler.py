@@ -0,0 +1,187 @@
+import csv
+import time
+from array import array
+from typing import Iterator, List, Tuple
+
+import pygame as pg
+from pygame import Rect, Surface
+
+from settings import (BLACK, FPS, PROFILER_ENABLED, PROFILER_FRAMES, WHITE,
+                      YELLOW)
+from textrender import GlyphAtlas
+
+__doc__ = """
+    Author: Mouaz Tabboush
+
+    profiler - Measures how long each phase of a frame takes
+    ========================================================
+
+    The Profiler times the phases of `Game.run()` with `time.perf_counter_ns()`
+    and keeps the last PROFILER_FRAMES frames in a ring buffer that is allocated once.
+
+    The game calls `mark()` after each phase, the time since the previous mark is added to that phase.
+    When the profiler is disabled `mark()` returns right away.
+
+    Press F3 in game to show the overlay and F4 to export the recorded frames to a csv file.
+
+    Requirements
+    ============
+    * pygame
+    * csv
+    * array
+    * settings
+    * textrender
+"""
+
+# phases of a frame, in the order they happen
+EVENTS = 0
+UPDATE = 1
+COLLISION = 2
+DRAW = 3
+PHASE_NAMES = ["events", "update", "collision", "draw"]
+PHASE_COLORS = [(0, 155, 255), (0, 228, 3), (255, 155, 0), (236, 57, 190)]
+
+# each frame is stored as its phases followed by the total frame time
+FRAME = len(PHASE_NAMES)
+FIELDS = FRAME + 1
+
+
+class Profiler:
+    """
+    Records the time spent in each phase of the last frames.
+    """
+    def __init__(self, size: int = PROFILER_FRAMES, enabled: bool = PROFILER_ENABLED):
+        """
+        Parameters
+        ----------
+        size: how many frames are kept
+        enabled: if frames are recorded from the start, even while the overlay is hidden
+
+        Tests
+        -----
+        * passing a size of 0"""
+        self.size = size
+        self.always_enabled = enabled
+        self.enabled = enabled
+        self.visible = False
+        # nanoseconds, FIELDS values per frame
+        self.buffer = array("q", bytes(8 * size * FIELDS))
+        self.current = array("q", bytes(8 * FIELDS))
+        self.index = 0
+        self.count = 0
+        self.frame_start = 0
+        self.last_mark = 0
+        self.font = None
+        # the text of the overlay changes every frame, so it's drawn from glyph atlases
+        self.glyphs = {}
+
+    def toggle(self) -> None:
+        """shows or hides the overlay.
+        without PROFILER_ENABLED recording is only done while it is shown"""
+        self.visible = not self.visible
+        enabled = self.visible or self.always_enabled
+        if enabled != self.enabled:
+            # the frame that is running right now was not timed from its start
+            self.frame_start = 0
+        self.enabled = enabled
+
+    def begin_frame(self) -> None:
+        """starts timing a new frame"""
+        if not self.enabled:
+            return
+        self.frame_start = self.last_mark = time.perf_counter_ns()
+        for phase in range(FIELDS):
+            self.current[phase] = 0
+
+    def mark(self, phase: int) -> None:
+        """adds the time since the last mark to a phase
+
+        Parameters
+        ----------
+        phase: one of EVENTS, UPDATE, COLLISION, DRAW"""
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        self.current[phase] += now - self.last_mark
+        self.last_mark = now
+
+    def end_frame(self) -> None:
+        """stores the timed frame inside the ring buffer"""
+        if not self.enabled or not self.frame_start:
+            return
+        self.current[FRAME] = time.perf_counter_ns() - self.frame_start
+        start = self.index * FIELDS
+        self.buffer[start:start + FIELDS] = self.current
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def frames(self) -> Iterator[Tuple[int, ...]]:
+        """yields the recorded frames from the oldest to the newest,
+        each as a tuple of nanoseconds (events, update, collision, draw, frame)"""
+        first = (self.index - self.count) % self.size
+        for i in range(self.count):
+            start = (first + i) % self.size * FIELDS
+            yield tuple(self.buffer[start:start + FIELDS])
+
+    def averages(self) -> List[float]:
+        """returns the average time in milliseconds of each phase and the frame"""
+        totals = [0] * FIELDS
+        for frame in self.frames():
+            for field in range(FIELDS):
+                totals[field] += frame[field]
+        return [total / max(self.count, 1) / 1e6 for total in totals]
+
+    def export_csv(self, filename: str) -> None:
+        """writes the recorded frames to a csv file, times are in milliseconds
+
+        Tests
+        -----
+        * file not writable
+        * nothing recorded yet"""
+        with open(filename, "w", newline="") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(["frame"] + [f"{name}_ms" for name in PHASE_NAMES] + ["frame_ms"])
+            for number, frame in enumerate(self.frames()):
+                writer.writerow([number] + [f"{value / 1e6:.4f}" for value in frame])
+
+    def draw_overlay(self, surface: Surface) -> None:
+        """draws a graph of the frame times and the average of each phase on a surface.
+        each bar of the graph is one frame, split into the colors of its phases.
+
+        Tests
+        -----
+        * pygame.font not initialized"""
+        if self.font is None:
+            self.font = pg.font.Font(None, 20)
+        graph_height = 100
+        bar_width = 2
+        bars = min(self.count, 150)
+        area = Rect(10, 10, 150 * bar_width + 140, graph_height + 20)
+        overlay = Surface(area.size)
+        overlay.set_alpha(200)
+        overlay.fill(BLACK)
+
+        # one pixel per 0.25ms
+        scale = 4 / 1e6
+        frames = list(self.frames())[-bars:]
+        for x, frame in enumerate(frames):
+            bottom = graph_height + 10
+            for phase in range(FRAME):
+                height = int(frame[phase] * scale)
+                if height:
+                    overlay.fill(PHASE_COLORS[phase],
+                                 (x * bar_width, bottom - height, bar_width, height))
+                bottom -= height
+        # line at the frame budget
+        budget = graph_height + 10 - int(1e9 / FPS * scale)
+        pg.draw.line(overlay, YELLOW, (0, budget), (150 * bar_width, budget))
+
+        averages = self.averages()
+        lines = [(f"{name} {averages[phase]:.2f}ms", PHASE_COLORS[phase])
+                 for phase, name in enumerate(PHASE_NAMES)]
+        lines.append((f"frame {averages[FRAME]:.2f}ms", WHITE))
+        for row, (text, color) in enumerate(lines):
+            if color not in self.glyphs:
+                self.glyphs[color] = GlyphAtlas(lambda character: self.font.render(character, True, color))
+            self.glyphs[color].draw(overlay, text, 150 * bar_width + 10, 10 + row * 20)
+        surface.blit(overlay, area)
@@ -0,0 +1,249 @@
+from typing import List, Tuple
+
+import pygame as pg
+from pygame import Rect, Surface
+
+from settings import HEIGHT, SHOT_KILL_DISTANCE, WIDTH
+from util import print_log
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+NUMPY_AVAILABLE = np is not None
+
+__doc__ = """
+    Author: Mouaz Tabboush
+
+    projectiles - Moves all projectiles at once with numpy
+    ======================================================
+
+    ProjectileArrays is an alternative to the Projectile sprites.
+    Instead of one sprite per shot it stores every projectile as one row in a set of numpy arrays
+    (position, position before the last update, velocity, starting x, frame, owner), so moving, animating, removing
+    and colliding all projectiles takes a few array operations instead of
+    one method call per projectile.
+
+    It is used instead of the sprites when PROJECTILE_ARRAYS is set and numpy is installed.
+
+    Requirements
+    ============
+    * pygame
+    * numpy (optional)
+    * settings
+    * util
+"""
+
+# owners of a projectile
+PLAYER = 0
+ENEMY = 1
+
+# time between two animation frames in ms, same as Projectile.animate()
+FRAME_TIME = 100
+
+
+class ProjectileArrays:
+    """
+    Holds all projectiles of a level in arrays.
+
+    The first `count` rows of every array are the live projectiles.
+    Dead projectiles are removed by moving the live ones to the front.
+    """
+
+    def __init__(self, game, capacity: int = 256):
+        """
+        Parameters
+        ----------
+        game: the game object, its asset registry must have the projectile frames
+        capacity: number of rows allocated at the start, the arrays grow when they are full
+
+        Tests
+        -----
+        * numpy not installed
+        * passing a capacity of 0"""
+        self.game = game
+        self.right_frames, self.left_frames = game.assets.get("projectile")
+        # all frames have the same size
+        self.width, self.height = self.right_frames[0].get_size()
+        self.count = 0
+        self.allocate(max(capacity, 1))
+
+    def allocate(self, capacity: int) -> None:
+        """creates the arrays with room for capacity projectiles, keeping the live ones"""
+        old = getattr(self, "x", None)
+        arrays = {
+            "x": np.zeros(capacity, np.int64),  # center
+            "y": np.zeros(capacity, np.int64),
+            "previous_x": np.zeros(capacity, np.int64),  # center before the last update
+            "previous_y": np.zeros(capacity, np.int64),
+            "vx": np.zeros(capacity, np.int64),
+            "vy": np.zeros(capacity, np.int64),
+            "origin_x": np.zeros(capacity, np.int64),
+            "frame": np.zeros(capacity, np.int64),
+            "last_update": np.zeros(capacity, np.int64),
+            "facing_right": np.zeros(capacity, np.bool_),
+            "owner": np.zeros(capacity, np.int8),
+        }
+        for name, array in arrays.items():
+            if old is not None:
+                array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self) -> int:
+        return self.count
+
+    def count_owned(self, owner: int) -> int:
+        """returns the number of live projectiles of PLAYER or ENEMY"""
+        return int(np.count_nonzero(self.owner[:self.count] == owner))
+
+    def spawn(self, x, y, x_vel, facing_right, shooter) -> None:
+        """adds a projectile, takes the same parameters as `Projectile.__init__()`
+
+        Tests
+        -----
+        * spawning more projectiles than the capacity"""
+        if self.count == self.capacity:
+            self.allocate(self.capacity * 2)
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        # a new projectile hasn't moved yet, so it isn't drawn behind the muzzle
+        self.previous_x[i] = x
+        self.previous_y[i] = y
+        self.vx[i] = x_vel
+        self.vy[i] = 0
+        self.origin_x[i] = x
+        self.frame[i] = 0
+        self.last_update[i] = self.game.get_ticks()
+        self.facing_right[i] = facing_right
+        self.owner[i] = PLAYER if shooter is self.game.player else ENEMY
+        self.count += 1
+
+    def keep(self, alive) -> None:
+        """removes every live projectile where alive is False
+
+        Parameters
+        ----------
+        alive: boolean array with one value per live projectile"""
+        kept = int(np.count_nonzero(alive))
+        if kept == self.count:
+            return
+        for name in ("x", "y", "previous_x", "previous_y", "vx", "vy", "origin_x", "frame",
+                     "last_update", "facing_right", "owner"):
+            array = getattr(self, name)
+            array[:kept] = array[:self.count][alive]
+        self.count = kept
+
+    def update(self) -> None:
+        """animates and moves all projectiles and removes the ones
+        that traveled further than SHOT_KILL_DISTANCE, like `Projectile.update()`"""
+        n = self.count
+        if not n:
+            return
+        now = self.game.get_ticks()
+        due = now - self.last_update[:n] > FRAME_TIME
+        self.frame[:n][due] = (self.frame[:n][due] + 1) % len(self.right_frames)
+        self.last_update[:n][due] = now
+
+        left = self.x[:n] - self.width // 2
+        self.keep(np.abs(self.origin_x[:n] - left) <= SHOT_KILL_DISTANCE)
+        n = self.count
+        self.previous_x[:n] = self.x[:n]
+        self.previous_y[:n] = self.y[:n]
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+
+    def rects(self) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray", "np.ndarray"]:
+        """returns the left, top, right and bottom of every live projectile"""
+        n = self.count
+        left = self.x[:n] - self.width // 2
+        top = self.y[:n] - self.height // 2
+        return left, top, left + self.width, top + self.height
+
+    def collide(self, rects: List[Rect], owner: int, batch: int = 1 << 20) -> Tuple["np.ndarray", "np.ndarray"]:
+        """tests the projectiles of an owner against rects, the same way Rect.colliderect does.
+        returns the indices of the projectiles that hit something
+        and a boolean array of the rects that were hit.
+
+        Parameters
+        ----------
+        rects: rects of the targets
+        owner: PLAYER or ENEMY
+        batch: the most projectile/rect pairs that are tested at once
+
+        Tests
+        -----
+        * passing no rects
+        * no live projectiles"""
+        if not rects or not self.count:
+            return np.zeros(0, np.int64), np.zeros(len(rects), np.bool_)
+        indices = np.flatnonzero(self.owner[:self.count] == owner)
+        left, top, right, bottom = (side[indices] for side in self.rects())
+        targets = np.array([(r.left, r.top, r.right, r.bottom) for r in rects], np.int64)
+        t_left, t_top, t_right, t_bottom = targets.T
+
+        hits = np.zeros(len(indices), np.bool_)
+        hit_rects = np.zeros(len(rects), np.bool_)
+        step = max(1, batch // len(rects))
+        for start in range(0, len(indices), step):
+            part = slice(start, start + step)
+            overlap = ((left[part, None] < t_right) & (right[part, None] > t_left)
+                       & (top[part, None] < t_bottom) & (bottom[part, None] > t_top))
+            hits[part] = overlap.any(axis=1)
+            hit_rects |= overlap.any(axis=0)
+        return indices[hits], hit_rects
+
+    def check_collisions(self) -> None:
+        """handles projectiles hitting the player or enemies,
+        replaces the groupcollide/spritecollide calls of `Game.check_collisions()`"""
+        game = self.game
+        dead = np.zeros(self.count, np.bool_)
+
+        # Player getting shot
+        player_hits, _ = self.collide([game.player.rect], ENEMY)
+        for i in player_hits:
+            # For each shot, reduce health by 10
+            # also push the player
+            game.player.health -= 10
+            game.player.pos += pg.math.Vector2(int(self.vx[i]), int(self.vy[i]))
+            print_log("<game.update>:Player got shot")
+        dead[player_hits] = True
+
+        # Mobs getting shot
+        enemies = game.all_enemies.sprites()
+        enemy_hits, enemies_hit = self.collide([enemy.rect for enemy in enemies], PLAYER)
+        for enemy, hit in zip(enemies, enemies_hit):
+            if hit:
+                enemy.die()
+                print_log("<game.update>:Enemy Killed")
+        dead[enemy_hits] = True
+
+        if dead.any():
+            self.keep(~dead)
+
+    def blit_list(self, camera, alpha: float = 1.0) -> List[Tuple[Surface, Rect]]:
+        """returns (image, rect) pairs of the projectiles on the screen, ready for `Surface.blits()`.
+        projectiles are drawn between their position before and after the last update.
+
+        Parameters
+        ----------
+        camera: the game's camera
+        alpha: how far the frame is between the last two updates"""
+        n = self.count
+        if not n:
+            return []
+        offset_x, offset_y = camera.offset
+        back = 1 - alpha
+        x, y = self.x[:n], self.y[:n]
+        left = x - self.width // 2 + offset_x + np.rint((self.previous_x[:n] - x) * back).astype(np.int64)
+        top = y - self.height // 2 + offset_y + np.rint((self.previous_y[:n] - y) * back).astype(np.int64)
+        visible = np.flatnonzero((left < WIDTH) & (left + self.width > 0)
+                                 & (top < HEIGHT) & (top + self.height > 0))
+        frames = (self.right_frames, self.left_frames)
+        width, height = self.width, self.height
+        return [(frames[0 if facing_right else 1][frame], Rect(x, y, width, height))
+                for x, y, frame, facing_right in zip(left[visible].tolist(), top[visible].tolist(),
+                                                    self.frame[visible].tolist(),
+                                                    self.facing_right[visible].tolist())]
+
@@ -14,6 +14,7 @@ __doc__ = """
     =====
     * Change LOGGING to True to log processes on the terminal.
     * Change CALLS_DEBUG to True to log function calls on the terminal.
+    * Change TRACING to True to save a trace of function calls that can be opened in a trace viewer.
 """
 
 
@@ -23,10 +24,21 @@ LOGGING_TO_FILE = True
 
 # Customize Logs
 LOG_INFO = True # set to true to see additional info when loading stuff
+# Modes below this one are dropped before the message is formatted.
+# Modes from lowest to highest: INFO, SUCCESS, WARNING, ERROR
+LOG_LEVEL = "INFO"
+LOG_FILE = "log.txt"
+LOG_MAX_SIZE = 1024 * 1024 # in bytes, log.txt is moved to log.txt.1 when it gets bigger
+LOG_BACKUPS = 3 # number of old log files that are kept
 
 # Shows function calls if set to true
 # NOTE: Functions need to have the @debug decorator in order to be debugged
 CALLS_DEBUG = False
+# Records how long every call of a @debug function takes and saves it to TRACE_FILE when the game quits.
+# The file can be opened in chrome://tracing or https://ui.perfetto.dev
+TRACING = False
+TRACE_FILE = os.path.join(os.path.dirname(__file__), "trace.json")
+TRACE_BUFFER_SIZE = 200000 # number of calls that are kept, older ones are dropped
 
 
 # System stats
@@ -37,18 +49,23 @@ ASSETS_PATH = os.path.join(GAME_PATH, "assets")
 SOUNDS_PATH = os.path.join(GAME_PATH, "snd")
 FONT_PATH = os.path.join(GAME_PATH, "fonts")
 MAP_PATH = os.path.join(GAME_PATH, "maps")
+MAP_CACHE_PATH = os.path.join(MAP_PATH, "cache")
+ASSET_CACHE_PATH = os.path.join(ASSETS_PATH, "cache")
 
 # Paths to assets
 XEON_FRAMES = os.path.join(ASSETS_PATH, "xeon_frames") # made with Gimp
+XEON_ATLAS = os.path.join(ASSETS_PATH, "xeon_frames_atlas") # made with atlas.py from XEON_FRAMES, set to None to load every frame
 COIN_SPRITESHEET = os.path.join(ASSETS_PATH, "coins_spritesheet.png") # made with Texture Packer
 HEALTHDROP_SPRITESHEET = os.path.join(ASSETS_PATH, "healthdrop_spritesheet.png") # made with Texture Packer
 BULLETS_SPRITESHEET = os.path.join(ASSETS_PATH, "bullets_normal.png") # made with Texture Packer
 HEALTHDROP_XML_DATA = os.path.join(ASSETS_PATH, "healthdrop_spritesheet.xml") # made with Texture Packer
+BASE_ENEMY_IMAGE = os.path.join(ASSETS_PATH, "enemy.png")
 MAIN_MENU_BG = os.path.join(ASSETS_PATH, "main_menu_background.png")
 
 # Paths to maps
 LEVEL1_PATH = os.path.join(MAP_PATH, "level1.tmx") # made with Tiled
 LEVEL2_PATH = os.path.join(MAP_PATH, "level2.tmx") # made with Tiled
+LEVELS = [LEVEL1_PATH, LEVEL2_PATH] # in the order they are played
 
 # Paths to Sounds
 INTRO_SOUND_PATH = os.path.join(SOUNDS_PATH, "intro.ogg")
@@ -67,9 +84,54 @@ INTRO_TEXT = os.path.join(GAME_PATH, "intro.txt")
 WIDTH = 1024
 HEIGHT = 800
 TITLE = "Xeon - The Unfinished game"
-FPS = 60
+FPS = 60 # limit of rendered frames per second
+# The game logic always runs at TICK_RATE updates per second, no matter how fast frames are rendered.
+# Sprites are drawn between their last two positions when INTERPOLATE is set.
+TICK_RATE = 60
+MAX_TICKS_PER_FRAME = 5 # the game slows down instead of freezing on very slow machines
+INTERPOLATE = True
 MUSIC_ON = True # turn of for a quiter experince :)
 MASTER_SOUND = 0.2 # can be between 0.0 and 1.0
+MUSIC_FADE_TIME = 1000 # in ms, tracks fade in and out for this long, a new track fades in after the old one faded out
+MIXER_BUFFER = 512 # in samples, smaller buffers play sounds with less delay but can crackle on slow machines
+
+# Map rendering
+# The map is split into square chunks that are rendered when they first come into view.
+# Only MAP_CHUNK_CACHE_SIZE chunks are kept in memory, the least recently seen ones are dropped.
+MAP_CHUNKED = True # set to False to render the whole map on one surface
+MAP_CHUNK_SIZE = 512 # in pixels, should be a multiple of the tile size
+MAP_CHUNK_CACHE_SIZE = 24 # a 1024x800 window touches up to 9 chunks of 512px
+MAP_CACHE = True # bakes rendered chunks into ./maps/cache, only used when MAP_CHUNKED is set
+MAP_COMPILED = True # loads maps from compiled level files in ./maps/cache instead of parsing the tmx files
+PREFETCH_NEXT_LEVEL = True # reads the next level in the background while the current one is played
+
+# Sprite frames are scaled, flipped and colorkeyed once and stored in ./assets/cache
+ASSET_CACHE = True
+# Images, sounds and maps are decoded by this many threads when the game starts, 0 loads them one by one
+ASSET_LOADER_WORKERS = 4
+
+# Platforms are sorted into a grid of square cells to speed up collision checks
+COLLISION_GRID_CELL_SIZE = 256 # in pixels
+# Adjacent and overlapping platforms are merged into fewer, bigger platforms
+MERGE_COLLIDERS = True
+# Name of a tile layer whose tiles should be solid as well, None to only use the platform objects
+COLLISION_TILE_LAYER = None
+
+# Only sprites near the camera are drawn, they are found with a grid of square cells
+CULLING_GRID_CELL_SIZE = 256 # in pixels
+CULLING_MARGIN = 64 # sprites this many pixels outside of the screen are still drawn, in pixels
+CULL_ANIMATIONS = False # sprites outside of the screen and its margin are not animated
+
+# Only redraw the areas under the sprites while the camera is not moving
+DIRTY_RECTS = False
+
+# Frame profiler, press F3 in game to show it and F4 to save the recorded frames to PROFILER_CSV
+PROFILER_ENABLED = False # records frames from the start, even while the overlay is hidden
+PROFILER_FRAMES = 600 # number of frames that are kept
+PROFILER_CSV = os.path.join(GAME_PATH, "profile.csv")
+
+# Rendered texts are cached, so each text is only rendered once
+TEXT_CACHE_SIZE = 128 # number of rendered texts that are kept
 
 
 # NOTE: Not being used anymore. using Font_Arcade instead.
@@ -83,6 +145,9 @@ PLAYER_JUMP = -20
 PLAYER_HEALTH = 100
 PLAYER_INVULNERABILITY = 1000
 SHOT_KILL_DISTANCE = 600
+PROJECTILE_POOL_SIZE = 256 # dead projectiles that are kept to be reused for new shots
+PROJECTILE_ARRAYS = False # moves all projectiles at once with numpy instead of one sprite each (see projectiles.py)
+ENEMY_ARRAYS = False # updates all enemies at once with numpy instead of one by one (see enemies.py)
 SHOOT_COOLDOWN = 400
 
 # Position of the camera's target on the window
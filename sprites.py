@@ -10,42 +10,93 @@ __doc__ = """
     ============
     * os
     * random
+    * xml.etree.ElementTree
     * pygame
     * util
     * settings
+    * enemies
+    * atlas
+    * assetcache
+    * loader
+    * animation
 """
 import random
+import xml.etree.ElementTree as ET
 from os import listdir
-from os.path import isfile, join
+from os.path import basename, isfile, join
+from types import SimpleNamespace
+from typing import Dict, Tuple
 
 import pygame as pg
-from pygame import Surface, key, mask, sprite
+from pygame import Surface, mask, sprite
 from settings import *
+from animation import CLAMP, LOOP, Animation, Animator
+from assetcache import asset_cache_file, asset_hash, is_asset_up_to_date, read_asset, source_stats, write_asset
+from atlas import atlas_files, load_atlas_index
+from enemies import state_value, state_vector
+from loader import AssetLoader
 from util import debug, print_log
 
 vec = pg.math.Vector2
 
 
 class Spritesheet:
-    """Spritesheet - A utility class for loading spritesheets as an entier image."""
+    """Spritesheet - A utility class for loading spritesheets as an entier image.
+
+    Every sheet has its own options for the frames cut out of it, like scaling and a colorkey.
+    Sheets made with Texture Packer come with a frame table, the rect of every frame by its name
+    (see `load_frame_table()`). Those frames are cut out once and shared by all sprites."""
     @debug
-    def __init__(self, filename) -> None:
+    def __init__(self, filename, image: Surface = None, frames: Dict[str, Tuple[int, int, int, int]] = None,
+                 scale: int = 1, colorkey=None) -> None:
         """
         Parameters
         ----------
         filename: the name of the spritesheet image to be loaded
+        image: (optional) the already decoded image of the file, e.g. decoded by an AssetLoader
+        frames: (optional) frame table of the sheet, see `load_frame_table()`
+        scale: how much the frames are scaled up
+        colorkey: (optional) color that is transparent in the frames
 
         Tests
         -----
         * not passing a str as filename
         * passing a filename of a file that doesn't exist
-        * passing a filename with a format that is not supported"""
+        * passing a filename with a format that is not supported
+        * passing a scale of 0"""
         self.filename = filename
-        self.spritesheet = pg.image.load(filename).convert()
+        if image is None:
+            image = pg.image.load(filename)
+        self.spritesheet = image.convert()
+        self.frames = frames or {}
+        self.scale = scale
+        self.colorkey = colorkey
+        self.cut_frames = {}
+
+    @staticmethod
+    def load_frame_table(xml_file) -> Dict[str, Tuple[int, int, int, int]]:
+        """reads the rects of all frames from a Texture Packer xml file.
+        returns (x, y, w, h) of every frame by its name, in the order of the file.
+        doesn't need pygame, so it can run on a worker of an AssetLoader.
+
+        Tests
+        -----
+        * passing valid xmldata
+        * passing invalid xmldata"""
+        return {sprite.get("n"): (int(sprite.get("x")), int(sprite.get("y")),
+                                  int(sprite.get("w")), int(sprite.get("h")))
+                for sprite in ET.parse(xml_file).getroot().iter("sprite")}
+
+    @staticmethod
+    def decode(filename, xml_file=None) -> Tuple[Surface, Dict[str, Tuple[int, int, int, int]]]:
+        """decodes the image of a sheet and reads its frame table if it has one,
+        returns the image and the frame table as they are passed to `__init__()`"""
+        return pg.image.load(filename), Spritesheet.load_frame_table(xml_file) if xml_file else None
 
     @debug
     def get_image(self, x, y, w, h) -> Surface:
-        """Returns aa part of the spritesheet as a surface.
+        """Returns aa part of the spritesheet as a surface,
+        scaled and with the colorkey of the sheet.
 
         Parameters
         ----------
@@ -64,32 +115,69 @@ class Spritesheet:
         image.blit(self.spritesheet, (0, 0), (x, y, w, h))
 
         # some spritesheet need custome scalling
-        if self.filename == BULLETS_SPRITESHEET:
+        if self.scale == 2:
             image = pg.transform.scale2x(image)
+        elif self.scale != 1:
+            image = pg.transform.scale(image, (w * self.scale, h * self.scale))
+        if self.colorkey is not None:
+            image.set_colorkey(self.colorkey)
 
         return image
 
+    def get_frame(self, name) -> Surface:
+        """returns a frame of the frame table by its name, it is only cut out the first time.
+        the frame is shared, it must not be changed.
+
+        Tests
+        -----
+        * passing a name that is not in the frame table"""
+        frame = self.cut_frames.get(name)
+        if frame is None:
+            frame = self.cut_frames[name] = self.get_image(*self.frames[name])
+        return frame
+
+    def get_frames(self, prefix: str = "") -> list:
+        """returns all frames whose names start with prefix, in the order of the frame table.
+        e.g. get_frames("xeon_walking_") for all frames of an animation"""
+        return [self.get_frame(name) for name in self.frames if name.startswith(prefix)]
+
 
 class ImageCollection:
     """
     Image_collection - A utility class for loading spritesheets as an different images.
     Using this is more expensive than Spritesheet but provides better frames.
+
+    When an up to date atlas of the folder exists (see atlas.py),
+    all images are loaded from it with a single decode and served as subsurfaces.
+
+    When an AssetLoader is passed the images are decoded by its workers
+    and are only available after `AssetLoader.wait()`.
     """
 
     @debug
-    def __init__(self, filename) -> None:
+    def __init__(self, filename, atlas=None, loader: AssetLoader = None) -> None:
         """
         Parameters
         ----------
         filename: the name of the spritesheet image to be loaded
+        atlas: (optional) path of the folder's atlas without an extension
+        loader: (optional) AssetLoader that decodes the images, without one they are loaded right away
 
         Tests
         -----
         * not passing a str as filename
         * passing a filename of a file that doesn't exist
-        * passing a filename with a format that is not supported"""
+        * passing a filename with a format that is not supported
+        * passing an atlas of another folder"""
         self.filename = filename
-        self.images = self.load_images_from_file(filename)
+        loader = loader or AssetLoader(0)
+        frames = load_atlas_index(filename, atlas) if atlas else None
+        if frames is not None:
+            self.images = self.load_images_from_atlas(atlas, frames, loader)
+        else:
+            if atlas:
+                print_log(f"<Image_collection>:atlas {atlas} is missing or outdated, loading every image", "WARNING")
+            self.images = self.load_images_from_file(filename, loader)
 
     @debug
     def get_image(self, name: str) -> Surface:
@@ -116,12 +204,40 @@ class ImageCollection:
             return Surface((50, 100))
 
     @debug
-    def load_images_from_file(self, filepath) -> dict:
+    def load_images_from_atlas(self, atlas, frames, loader: AssetLoader) -> dict:
+        """loads the atlas image and cuts it into subsurfaces
+
+        Parameters
+        ----------
+        atlas -> path of the atlas without an extension
+        frames -> rect of every image inside the atlas by its name
+        loader -> AssetLoader that decodes the atlas image
+
+        Tests
+        -----
+        * atlas image missing
+        * frame rect outside of the atlas"""
+        image_file, _ = atlas_files(atlas)
+        print_log("<Image_collection.load_images_from_atlas>:Loading ..." + image_file[-30:])
+        images = {}
+
+        def cut(image):
+            # the same scaling as load_images_from_file, done once for all images
+            self.atlas = pg.transform.scale2x(image.convert())
+            images.update({name: self.atlas.subsurface((2 * x, 2 * y, 2 * w, 2 * h))
+                           for name, (x, y, w, h) in frames.items()})
+
+        loader.add(basename(image_file), pg.image.load, image_file, finish=cut)
+        return images
+
+    @debug
+    def load_images_from_file(self, filepath, loader: AssetLoader) -> dict:
         """loads all images inside the file
 
         Parameters
         ----------
         filepath -> the folder where the images are stored
+        loader -> AssetLoader that decodes the images
 
         Tests
         -----
@@ -134,18 +250,134 @@ class ImageCollection:
             print_log("<Image_collection.load_images_from_file>Folder not found", "ERROR")
             return {}
 
-        for f in f_list:
-            print_log(
-                "<Image_collection.load_images_from_file>:Loading ..." + join(filepath, f)[-30:])
+        def decode(path):
             try:
-                images[f] = pg.transform.scale2x(
-                    pg.image.load(join(filepath, f)).convert())
+                return pg.image.load(path)
             except:
                 print_log(
-                    "<Image_collection.load_images_from_file>:can't import " + join(filepath, f), "WARNING")
+                    "<Image_collection.load_images_from_file>:can't import " + path, "WARNING")
+
+        def add(name, image):
+            if image is not None:
+                images[name] = pg.transform.scale2x(image.convert())
+
+        for f in f_list:
+            print_log(
+                "<Image_collection.load_images_from_file>:Loading ..." + join(filepath, f)[-30:])
+            loader.add(join(basename(filepath), f), decode, join(filepath, f),
+                       finish=lambda image, name=f: add(name, image))
         return images
 
 
+class AssetRegistry:
+    """
+    AssetRegistry - Builds each set of frames once and shares it between all sprites.
+
+    A builder function is registered for every name, it is called with the game object
+    the first time the asset is needed and its result is kept until it is released.
+    Sprites must not change the surfaces they get from the registry.
+
+    With ASSET_CACHE set, the finished frames of assets that name their source files
+    are stored in ./assets/cache and loaded from there as long as the builder,
+    its sources and its params don't change. `python bake.py` stores them ahead of time.
+    """
+
+    def __init__(self, game) -> None:
+        """
+        Parameters
+        ----------
+        game: the game object that is passed to the builders"""
+        self.game = game
+        self.builders = {}
+        self.sources = {}
+        self.params = {}
+        self.assets = {}
+
+    def register(self, name: str, builder, sources: Tuple[str, ...] = (), params: tuple = ()) -> None:
+        """registers the function that builds an asset
+
+        Parameters
+        ----------
+        name -> key of the asset
+        builder -> function that takes the game object and returns the asset
+        sources -> (optional) files and folders the builder reads, needed to cache the asset
+        params -> (optional) settings, options and helper functions or classes the builder uses,
+                  the cached asset is rebuilt when one of them changes"""
+        self.builders[name] = builder
+        self.sources[name] = sources
+        self.params[name] = params
+
+    def get(self, name: str):
+        """returns an asset, building it if it is not loaded yet
+
+        Tests
+        -----
+        * passing a name that was never registered"""
+        try:
+            return self.assets[name]
+        except KeyError:
+            asset = self.assets[name] = self.load(name)
+            return asset
+
+    def load(self, name: str):
+        """builds an asset or loads it from its cache file
+
+        Tests
+        -----
+        * cache file from an older version
+        * ./assets/cache not writable"""
+        builder = self.builders[name]
+        if not ASSET_CACHE or not self.sources[name]:
+            print_log(f"<AssetRegistry.load>:building {name}")
+            return builder(self.game)
+
+        cache_file = self.cache_file(name)
+        stats = source_stats(self.sources[name])
+        if os.path.isfile(cache_file):
+            try:
+                return read_asset(cache_file, stats)
+            except (OSError, ValueError, pg.error) as error:
+                print_log(f"<AssetRegistry.load>:can't read {cache_file} ({error})", "WARNING")
+        print_log(f"<AssetRegistry.load>:building {name}")
+        asset = builder(self.game)
+        try:
+            write_asset(cache_file, asset, stats)
+        except (OSError, TypeError) as error:
+            print_log(f"<AssetRegistry.load>:can't cache {name} ({error})", "WARNING")
+        return asset
+
+    def cache_file(self, name: str) -> str:
+        """returns the path of an asset's cache file, see `assetcache.asset_cache_file()`"""
+        return asset_cache_file(name, asset_hash(self.builders[name], self.sources[name], self.params[name]))
+
+    def is_cached(self, name: str) -> bool:
+        """returns True if an asset has an up to date cache file, without reading its frames"""
+        return bool(self.sources[name]) and is_asset_up_to_date(self.cache_file(name),
+                                                                source_stats(self.sources[name]))
+
+    def register_baked(self) -> None:
+        """registers the assets that bake.py bakes ahead of time: the player and projectile frames.
+        their builders load their own sources, so they don't need the game object"""
+        player_sources = (XEON_FRAMES, *atlas_files(XEON_ATLAS)) if XEON_ATLAS else (XEON_FRAMES,)
+        self.register("player", Player.build_frames, player_sources,
+                      (XEON_SPRITESHEET_KEYCOLOR, ImageCollection, Spritesheet))
+        self.register("projectile", Projectile.build_frames, (BULLETS_SPRITESHEET,), (BLACK, Spritesheet))
+
+    @debug
+    def preload(self, *names: str) -> None:
+        """builds the given assets, or all registered assets if no name is given.
+        assets that are already loaded are skipped."""
+        for name in names or self.builders:
+            self.get(name)
+
+    @debug
+    def release(self, *names: str) -> None:
+        """drops the given assets, or all assets if no name is given.
+        they are built again the next time they are needed."""
+        for name in names or list(self.assets):
+            self.assets.pop(name, None)
+
+
 class Player(sprite.Sprite):
     """
     Description
@@ -165,8 +397,7 @@ class Player(sprite.Sprite):
         super().__init__()
         self.game = game
         # animation variables
-        self.current_frame: int = 0
-        self.last_update: int = 0
+        self.animator = Animator()
 
         # sprite variables
         self.load_images()
@@ -193,24 +424,35 @@ class Player(sprite.Sprite):
         self.taking_damage = False
         self.shooting_locked = False
         self.shoot_cooldown = SHOOT_COOLDOWN
-        self.last_shot = pg.time.get_ticks()
-        self.last_damge = pg.time.get_ticks()
+        self.last_shot = self.game.get_ticks()
+        self.last_damge = self.game.get_ticks()
 
     @debug
     def load_images(self):
-        """load images form the xeon_image_collecition.
+        """takes the frames and animations from the game's asset registry,
+        see `build_frames()` and `build_animations()`"""
+        for name, frames in self.game.assets.get("player").items():
+            setattr(self, name, frames)
+        self.animations = self.game.assets.get("player_animations")
+
+    @staticmethod
+    def build_frames(game) -> dict:
+        """builds the player's frames from the xeon frames, or their atlas if it is up to date.
+        returns a dict of frame lists by the name of their attribute.
+        the result is baked by bake.py, so this only runs when the baked frames are missing or outdated.
         
         Tests
         -----
         * passing wrong image name to the local load function
         * passing a none string
         * missing global variables"""
-        load = self.game.xeon_image_collection.get_image
+        frames = SimpleNamespace()
+        load = ImageCollection(XEON_FRAMES, XEON_ATLAS).get_image
 
-        self.standing_frames_r = [
+        frames.standing_frames_r = [
             load("xeon_idle_1.png")
         ]
-        self.walking_frames_r = [
+        frames.walking_frames_r = [
             load("xeon_walking_1.png"),
             load("xeon_walking_2.png"),
             load("xeon_walking_3.png"),
@@ -222,7 +464,7 @@ class Player(sprite.Sprite):
             load("xeon_walking_9.png"),
             load("xeon_walking_10.png"),
         ]
-        self.jumping_frames_r = [
+        frames.jumping_frames_r = [
             load("xeon_jumping_1.png"),
             load("xeon_jumping_2.png"),
             load("xeon_jumping_3.png"),
@@ -236,13 +478,13 @@ class Player(sprite.Sprite):
         ]
 
         # loading the shooting frames
-        self.standing_shooting_frames_r = [
+        frames.standing_shooting_frames_r = [
             load("xeon_idle_shooting_1.png"),
             load("xeon_idle_shooting_2.png"),
             load("xeon_idle_shooting_3.png"),
         ]
 
-        self.jumping_shooting_frames_r = [
+        frames.jumping_shooting_frames_r = [
             load("xeon_jumping_shooting_1.png"),
             load("xeon_jumping_shooting_2.png"),
             load("xeon_jumping_shooting_3.png"),
@@ -255,7 +497,7 @@ class Player(sprite.Sprite):
             load("xeon_jumping_shooting_10.png"),
         ]
 
-        self.walking_shooting_frames_r = [
+        frames.walking_shooting_frames_r = [
             load("xeon_walking_shooting_1.png"),
             load("xeon_walking_shooting_2.png"),
             load("xeon_walking_shooting_3.png"),
@@ -269,26 +511,53 @@ class Player(sprite.Sprite):
         ]
 
         # flip all frames
-        self.standing_frames_l = [pg.transform.flip(x, True, False) for x in self.standing_frames_r]
-        self.walking_frames_l = [pg.transform.flip(x, True, False) for x in self.walking_frames_r]
-        self.jumping_frames_l = [pg.transform.flip(x, True, False) for x in self.jumping_frames_r]
-        self.standing_shooting_frames_l = [pg.transform.flip(x, True, False) for x in self.standing_shooting_frames_r]
-        self.walking_shooting_frames_l = [pg.transform.flip(x, True, False) for x in self.walking_shooting_frames_r]
-        self.jumping_shooting_frames_l = [pg.transform.flip( x, True, False) for x in self.jumping_shooting_frames_r]
+        frames.standing_frames_l = [pg.transform.flip(x, True, False) for x in frames.standing_frames_r]
+        frames.walking_frames_l = [pg.transform.flip(x, True, False) for x in frames.walking_frames_r]
+        frames.jumping_frames_l = [pg.transform.flip(x, True, False) for x in frames.jumping_frames_r]
+        frames.standing_shooting_frames_l = [pg.transform.flip(x, True, False) for x in frames.standing_shooting_frames_r]
+        frames.walking_shooting_frames_l = [pg.transform.flip(x, True, False) for x in frames.walking_shooting_frames_r]
+        frames.jumping_shooting_frames_l = [pg.transform.flip( x, True, False) for x in frames.jumping_shooting_frames_r]
 
         # Set key color
-        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in self.standing_frames_l]
-        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in self.standing_frames_r]
-        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in self.standing_shooting_frames_l]
-        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in self.standing_shooting_frames_r]
-        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in self.walking_frames_l]
-        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in self.walking_frames_r]
-        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in self.walking_shooting_frames_l]
-        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in self.walking_shooting_frames_r]
-        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in self.jumping_frames_l]
-        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in self.jumping_frames_r]
-        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in self.jumping_shooting_frames_l]
-        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in self.jumping_shooting_frames_r]
+        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in frames.standing_frames_l]
+        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in frames.standing_frames_r]
+        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in frames.standing_shooting_frames_l]
+        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in frames.standing_shooting_frames_r]
+        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in frames.walking_frames_l]
+        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in frames.walking_frames_r]
+        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in frames.walking_shooting_frames_l]
+        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in frames.walking_shooting_frames_r]
+        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in frames.jumping_frames_l]
+        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in frames.jumping_frames_r]
+        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in frames.jumping_shooting_frames_l]
+        [x.set_colorkey(XEON_SPRITESHEET_KEYCOLOR) for x in frames.jumping_shooting_frames_r]
+        return vars(frames)
+
+    @staticmethod
+    def build_animations(game) -> dict:
+        """builds the player's animations from its frames.
+        returns a dict of animations by (state, shooting, face_right),
+        state is one of "idle", "walk", "jump" and "fall".
+
+        Tests
+        -----
+        * player frames missing from the asset registry"""
+        frames = game.assets.get("player")
+        animations = {}
+        for face_right, side in ((True, "r"), (False, "l")):
+            def sequence(name, part=slice(None)):
+                return frames[f"{name}_frames_{side}"][part]
+
+            # the jump takes the first frames of the jumping frames, the fall the last ones
+            animations["jump", False, face_right] = Animation(sequence("jumping", slice(0, 6)), 50, CLAMP)
+            animations["jump", True, face_right] = Animation(sequence("jumping_shooting", slice(0, 6)), 50)
+            animations["fall", False, face_right] = Animation(sequence("jumping", slice(6, 8)), 50, CLAMP)
+            animations["fall", True, face_right] = Animation(sequence("jumping_shooting", slice(6, 8)), 50)
+            animations["walk", False, face_right] = Animation(sequence("walking"), 50)
+            animations["walk", True, face_right] = Animation(sequence("walking_shooting"), 50)
+            animations["idle", False, face_right] = Animation(sequence("standing"), 50)
+            animations["idle", True, face_right] = Animation(sequence("standing_shooting"), 50)
+        return animations
 
     def update_movement_flags(self):
         """updates movement flags so
@@ -406,7 +675,7 @@ class Player(sprite.Sprite):
         * missing global variables
         """
 
-        keyState = key.get_pressed()
+        keyState = self.game.get_pressed()
 
         self.animate()
         # apply shooting
@@ -427,8 +696,7 @@ class Player(sprite.Sprite):
         self.move_x()
         # apply collision with platforms on the x
         # TODO: move to a separate function
-        platforms = self.game.platforms
-        platform_hits = sprite.spritecollide(self, platforms, False)
+        platform_hits = self.game.platform_grid.spritecollide(self)
         if platform_hits:
             # handel x collisions
             for hit in platform_hits:
@@ -458,8 +726,7 @@ class Player(sprite.Sprite):
 
         # apply collision with platforms on the y
         # TODO: move to a separate function
-        platforms = self.game.platforms
-        platform_hits = sprite.spritecollide(self, platforms, False)
+        platform_hits = self.game.platform_grid.spritecollide(self)
         if platform_hits:
             # handel x collisions
             for hit in platform_hits:
@@ -500,10 +767,8 @@ class Player(sprite.Sprite):
             y_offset = self.rect.y + self.rect.height//3
             x_vel = 10
 
-        projectile = Projectile(x_offset, y_offset, x_vel,
-                                self.animation_flags["face_right"], self)
-        self.game.player_projectiles.add(projectile)
-        self.game.all_sprites.add(projectile)
+        self.game.spawn_projectile(x_offset, y_offset, x_vel,
+                                   self.animation_flags["face_right"], self)
 
     def take_damage(self, amount):
         """reduces player's health by the amout passed.
@@ -517,13 +782,13 @@ class Player(sprite.Sprite):
         * not passing a number as amount
         * missing globale variables
         """
-        now = pg.time.get_ticks()
+        now = self.game.get_ticks()
         if now - self.last_damge > PLAYER_INVULNERABILITY:
             self.taking_damage = False
         if not self.taking_damage:
             self.taking_damage = True
             self.health -= amount
-            self.last_damge = pg.time.get_ticks()
+            self.last_damge = self.game.get_ticks()
 
     def jump(self):
         """"controls when the player is allowed to jump and changes their vertical speed
@@ -535,7 +800,7 @@ class Player(sprite.Sprite):
         # jump only if standing on a platform
         # detect two pixels below the player
         self.rect.y += 2
-        hits = sprite.spritecollide(self, self.game.platforms, False)
+        hits = self.game.platform_grid.spritecollide(self)
         self.rect.y -= 2
         if hits:
             self.vel.y = PLAYER_JUMP
@@ -553,115 +818,29 @@ class Player(sprite.Sprite):
                 self.vel.y = PLAYER_JUMP//2
 
     def animate(self):
-        """Animates the Object
+        """Animates the Object by playing the animation of its state,
+        a shooting animation is played once.
 
         Tests
         -----
         * key error
         * missing local variables of the object """
-        now = pg.time.get_ticks()
-
-        def show_continuous_animation(frame_list):
-            """Loops through the frames list
-
-            Tests
-            -----
-            * frame_list not a list
-            * missing local variables of the object
-            """
-            self.last_update = now
-            self.current_frame = (self.current_frame + 1) % len(frame_list)
-            pos = self.pos
-            self.image = frame_list[self.current_frame]
-            self.pos = pos
-
-        def show_linear_animation(frame_list):
-            """Goes through the frames and stops at the last one.
-            
-            Tests
-            -----
-            * frame_list not a list
-            * missing local variables of the object"""
-            self.last_update = now
-            self.current_frame = min(
-                self.current_frame + 1, len(frame_list) - 1)
-            pos = self.pos
-            self.image = frame_list[self.current_frame]
-            self.pos = pos
-
-        # show jump animation
-        if self.animation_flags["jump"]:
-            if self.animation_flags["shoot"]:
-                if now - self.last_update > 50:
-                    if self.animation_flags["face_right"]:
-                        show_continuous_animation(
-                            self.jumping_shooting_frames_r[:6])
-                    elif not self.animation_flags["face_right"]:
-                        show_continuous_animation(
-                            self.jumping_shooting_frames_l[:6])
-                if self.current_frame == len(self.standing_frames_r[:6]) - 1:
-                    self.animation_flags["shoot"] = False
-            else:
-                if now - self.last_update > 50:
-                    if self.animation_flags["face_right"]:
-                        show_linear_animation(self.jumping_frames_r[:6])
-                    elif not self.animation_flags["face_right"]:
-                        show_linear_animation(self.jumping_frames_l[:6])
-
-        # show falling animation
-        elif self.animation_flags["fall"]:
-            if self.animation_flags["shoot"]:
-                if now - self.last_update > 50:
-                    if self.animation_flags["face_right"]:
-                        show_continuous_animation(
-                            self.jumping_shooting_frames_r[6:8])
-                    elif not self.animation_flags["face_right"]:
-                        show_continuous_animation(
-                            self.jumping_shooting_frames_l[6:8])
-                if self.current_frame == len(self.jumping_shooting_frames_l[6:8]) - 1:
-                    self.animation_flags["shoot"] = False
-            else:
-                if now - self.last_update > 50:
-                    if self.animation_flags["face_right"]:
-                        show_linear_animation(self.jumping_frames_r[6:8])
-                    elif not self.animation_flags["face_right"]:
-                        show_linear_animation(self.jumping_frames_l[6:8])
-
-        # show walking animation
-        elif self.animation_flags["walk"] and not self.taking_damage:
-            if self.animation_flags["shoot"]:
-                if now - self.last_update > 50:
-                    if self.animation_flags["face_right"]:
-                        show_continuous_animation(
-                            self.walking_shooting_frames_r)
-                    elif not self.animation_flags["face_right"]:
-                        show_continuous_animation(
-                            self.walking_shooting_frames_l)
-                if self.current_frame == len(self.walking_shooting_frames_r) - 1:
-                    self.animation_flags["shoot"] = False
-            else:
-                if now - self.last_update > 50:
-                    if self.animation_flags["face_right"]:
-                        show_continuous_animation(self.walking_frames_r)
-                    elif not self.animation_flags["face_right"]:
-                        show_continuous_animation(self.walking_frames_l)
+        flags = self.animation_flags
+        if flags["jump"]:
+            state = "jump"
+        elif flags["fall"]:
+            state = "fall"
+        elif flags["walk"] and not self.taking_damage:
+            state = "walk"
         else:
-            if self.animation_flags["shoot"]:
-                if now - self.last_update > 50:
-                    if self.animation_flags["face_right"]:
-                        show_continuous_animation(
-                            self.standing_shooting_frames_r)
-                    elif not self.animation_flags["face_right"]:
-                        show_continuous_animation(
-                            self.standing_shooting_frames_l)
-                if self.current_frame == len(self.standing_shooting_frames_r) - 1:
-                    self.animation_flags["shoot"] = False
-            else:
-                if now - self.last_update > 50:
-                    if self.animation_flags["face_right"]:
-                        show_continuous_animation(self.standing_frames_r)
-                    elif not self.animation_flags["face_right"]:
-                        show_continuous_animation(self.standing_frames_l)
+            state = "idle"
+        animation = self.animations[state, flags["shoot"], flags["face_right"]]
+
+        image = self.animator.play(animation, self.game.get_ticks())
+        if image is not None:
+            self.image = image
+        if flags["shoot"] and self.animator.frame == animation.last:
+            flags["shoot"] = False
 
 
 class Projectile(sprite.Sprite):
@@ -683,23 +862,47 @@ class Projectile(sprite.Sprite):
         * problem with load_images()
         """
         super().__init__()
-        self.shooter = shooter
         self.game = shooter.game
+        # set when the projectile belongs to a ProjectilePool
+        self.pool = None
+        self.animator = Animator()
         self.load_images()
+        self.rect = self.right_frames[0].get_rect()
+        self.vel = vec(0, 0)
+        self.reset(x, y, x_vel, facing_right, shooter)
 
+    def reset(self, x, y, x_vel, facing_right, shooter):
+        """puts the projectile back into the state of a new shot, used when it is reused by a pool.
+        takes the same parameters as `__init__()`"""
+        self.shooter = shooter
         self.image = self.right_frames[0] if facing_right else self.left_frames[0]
-        self.rect = self.image.get_rect()
+        self.rect.size = self.image.get_size()
         self.rect.center = (x, y)
-        self.vel = vec(x_vel, 0)
+        self.vel.update(x_vel, 0)
 
         self.facing_right = facing_right
         self.init_x_pos = x
-        self.current_frame = 0
-        self.last_update = pg.time.get_ticks()
+        self.animator.reset(self.game.get_ticks())
+
+    def kill(self):
+        """removes the projectile from all groups and hands it back to its pool"""
+        was_alive = self.alive()
+        super().kill()
+        if was_alive and self.pool is not None:
+            self.pool.release(self)
 
     @debug
     def load_images(self):
-        """loads images from the bullets_spritesheet
+        """takes the frames and animations from the game's asset registry,
+        see `build_frames()` and `build_animations()`"""
+        self.right_frames, self.left_frames = self.game.assets.get("projectile")
+        self.animations = self.game.assets.get("projectile_animations")
+
+    @staticmethod
+    def build_frames(game) -> Tuple[list, list]:
+        """loads images from the bullets spritesheet.
+        returns the frames facing right and the frames facing left.
+        the result is baked by bake.py, so this only runs when the baked frames are missing or outdated.
 
         Tests
         -----
@@ -710,15 +913,19 @@ class Projectile(sprite.Sprite):
         MARGIN_RIGHT = 1
         HEIGHT = 7
         WIDTH = 16
-        load = self.game.bullets_spritesheet.get_image
-        # range(5) because it's only five frames
-        self.right_frames = [
+        load = Spritesheet(BULLETS_SPRITESHEET, scale=2, colorkey=BLACK).get_image
+        # range(5) because it's only five frames, the sheet scales them and sets their colorkey
+        right_frames = [
             load(i*WIDTH, i, WIDTH-MARGIN_RIGHT, HEIGHT)for i in range(5)]
-        self.left_frames = [pg.transform.flip(
-            x, True, False) for x in self.right_frames]
-        # Set key color
-        [x.set_colorkey(BLACK) for x in self.right_frames]
-        [x.set_colorkey(BLACK) for x in self.left_frames]
+        left_frames = [pg.transform.flip(
+            x, True, False) for x in right_frames]
+        return right_frames, left_frames
+
+    @staticmethod
+    def build_animations(game) -> dict:
+        """returns the projectile's animations by facing_right"""
+        right_frames, left_frames = game.assets.get("projectile")
+        return {True: Animation(right_frames, 100), False: Animation(left_frames, 100)}
 
     def animate(self):
         """animates an object
@@ -727,24 +934,12 @@ class Projectile(sprite.Sprite):
         -----
         * missing local variable of the object
         * right_framges and left_frames not being a list of pygame.Surface"""
-        now = pg.time.get_ticks()
-        if now - self.last_update > 100:
-            if self.facing_right:
-                self.last_update = now
-                self.current_frame = (
-                    self.current_frame + 1) % len(self.right_frames)
-                self.image = self.right_frames[self.current_frame]
-                center = self.rect.center
-                self.rect = self.image.get_rect()
-                self.rect.center = center
-            else:
-                self.last_update = now
-                self.current_frame = (
-                    self.current_frame + 1) % len(self.left_frames)
-                self.image = self.left_frames[self.current_frame]
-                center = self.rect.center
-                self.rect = self.image.get_rect()
-                self.rect.center = center
+        image = self.animator.play(self.animations[self.facing_right], self.game.get_ticks())
+        if image is not None:
+            self.image = image
+            center = self.rect.center
+            self.rect.size = image.get_size()
+            self.rect.center = center
 
     def update(self):
         """updates object logic
@@ -753,7 +948,8 @@ class Projectile(sprite.Sprite):
         -----
         Problem with animate()
         missing global variables"""
-        self.animate()
+        if self.game.is_visible(self):
+            self.animate()
         # calculate traveled distance and kill when excided
         self.x_diff = abs(self.init_x_pos - self.rect.x)
         if self.x_diff > SHOT_KILL_DISTANCE:
@@ -762,8 +958,91 @@ class Projectile(sprite.Sprite):
         self.rect.center += self.vel
 
 
+class ProjectilePool:
+    """
+    Keeps up to `capacity` dead projectiles and reuses them for new shots,
+    instead of creating a new sprite for every shot.
+
+    Projectiles go back to the pool when they are killed.
+    When the pool is empty a new projectile is created and the exhaustion is counted,
+    so the game never runs out of shots.
+    """
+
+    def __init__(self, game, capacity: int = PROJECTILE_POOL_SIZE):
+        """
+        Parameters
+        ----------
+        game -> the game object, the projectiles are preallocated for its player
+        capacity -> how many dead projectiles are kept
+
+        Tests
+        -----
+        * game without a player
+        * passing a capacity of 0"""
+        self.game = game
+        self.capacity = capacity
+        self.free = []
+        self.created = 0
+        self.in_use = 0
+        self.high_water_mark = 0
+        self.exhaustions = 0
+        for _ in range(capacity):
+            self.free.append(self.create(0, 0, 0, True, game.player))
+
+    def create(self, x, y, x_vel, facing_right, shooter) -> "Projectile":
+        """creates a new projectile that belongs to this pool"""
+        projectile = Projectile(x, y, x_vel, facing_right, shooter)
+        projectile.pool = self
+        self.created += 1
+        return projectile
+
+    def spawn(self, x, y, x_vel, facing_right, shooter, group: sprite.Group) -> "Projectile":
+        """takes a projectile from the pool, resets it and adds it to group and all_sprites.
+        takes the same parameters as `Projectile.__init__()` and the group of the shooter's projectiles.
+
+        Tests
+        -----
+        * spawning more projectiles than the capacity"""
+        if self.free:
+            projectile = self.free.pop()
+            projectile.reset(x, y, x_vel, facing_right, shooter)
+        else:
+            self.exhaustions += 1
+            projectile = self.create(x, y, x_vel, facing_right, shooter)
+        self.in_use += 1
+        self.high_water_mark = max(self.high_water_mark, self.in_use)
+        group.add(projectile)
+        self.game.all_sprites.add(projectile)
+        return projectile
+
+    def release(self, projectile: "Projectile") -> None:
+        """takes back a killed projectile, it is dropped if the pool is full"""
+        self.in_use -= 1
+        if len(self.free) < self.capacity:
+            self.free.append(projectile)
+
+    def metrics(self) -> dict:
+        """returns the size of the pool and how it has been used"""
+        return {
+            "capacity": self.capacity,
+            "free": len(self.free),
+            "in_use": self.in_use,
+            "high_water_mark": self.high_water_mark,
+            "exhaustions": self.exhaustions,
+            "created": self.created,
+        }
+
+
 class BaseEnemy(sprite.Sprite):
-    """A base class for enemies"""
+    """A base class for enemies
+
+    When the game has enemy arrays (see enemies.py) the enemy's
+    pos, vel, acc and last_shot are stored there and updated for all enemies at once."""
+
+    pos = state_vector("pos")
+    vel = state_vector("vel")
+    acc = state_vector("acc")
+    last_shot = state_value("last_shot")
 
     def __init__(self, game, x, y):
         """
@@ -780,20 +1059,32 @@ class BaseEnemy(sprite.Sprite):
         * missing gloable variables
         """
         super().__init__()
-        # temporary, because i have to format the spritesheet.
-        self.image = pg.image.load(os.path.join(
-            ASSETS_PATH, "enemy.png")).convert()
-        self.image = pg.transform.scale2x(self.image)
-        self.image.set_colorkey(BASE_ENEMY_KEYCOLOR)
+        self.game = game
+        self.image = self.game.assets.get("base_enemy")
 
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
+        self.arrays = game.enemy_arrays
+        if self.arrays is not None:
+            self.index = self.arrays.add(self, x, y)
+            return
         self.pos = vec(x, y)
         self.vel = vec(0, 0)
         self.acc = vec(0, 0)
-        self.game = game
-        self.last_shot = pg.time.get_ticks()
+        self.last_shot = self.game.get_ticks()
 
+    @staticmethod
+    def build_image(game) -> Surface:
+        """loads the enemy's image
+
+        Tests
+        -----
+        * enemy.png missing"""
+        # temporary, because i have to format the spritesheet.
+        image = pg.image.load(BASE_ENEMY_IMAGE).convert()
+        image = pg.transform.scale2x(image)
+        image.set_colorkey(BASE_ENEMY_KEYCOLOR)
+        return image
 
     def shot(self):
         """
@@ -804,11 +1095,8 @@ class BaseEnemy(sprite.Sprite):
         * problem with Projectile class
         * missing variables from game object 
         """
-        projectile = Projectile(*self.rect.midleft, -20,
-                                False, self)  # hardcoded for testing
-        self.game.enemy_projectiles.add(projectile)
-        self.game.all_sprites.add(projectile)
-        pass
+        self.game.spawn_projectile(*self.rect.midleft, -20,
+                                   False, self)  # hardcoded for testing
 
     def die(self):
         """kills an enemy and randomly spawn a healthdrop
@@ -826,15 +1114,24 @@ class BaseEnemy(sprite.Sprite):
             self.game.coins.add(new_healthdrop)
         self.kill()
 
+    def kill(self):
+        """removes the enemy from all groups and its row from the enemy arrays"""
+        if self.arrays is not None and self.index is not None:
+            self.arrays.remove(self)
+        super().kill()
+
     def update(self):
         """
         updates the logic of the player object.
+        does nothing when the enemy arrays update all enemies at once.
 
         Tests
         -----
         * missing global variables
         * missing local variables
         """
+        if self.arrays is not None:
+            return
         # apply equation of motion
         self.acc = vec(0, PLAYER_GRAVITY)
         self.acc.x += self.vel.x * PLAYER_FRICTION
@@ -842,16 +1139,15 @@ class BaseEnemy(sprite.Sprite):
         self.pos += self.vel + 0.5 * self.acc
         self.rect.midbottom = self.pos
 
-        platform_hits = pg.sprite.spritecollide(
-            self, self.game.platforms, False)
+        platform_hits = self.game.platform_grid.spritecollide(self)
         for platform in platform_hits:
             self.pos.y = platform.rect.top + 1
             self.vel.y = 0
 
-        now = pg.time.get_ticks()
+        now = self.game.get_ticks()
         if now - self.last_shot > random.randint(1500, 3000):
             self.shot()
-            self.last_shot = pg.time.get_ticks()
+            self.last_shot = self.game.get_ticks()
     
     # (Not yet implemeted)
     def move(self):
@@ -880,6 +1176,9 @@ class BaseEnemy(sprite.Sprite):
 class HealthDrop(sprite.Sprite):
     """A class representing collectable healthdrops"""
 
+    # healthdrops don't move, the CullingGroup of the game doesn't have to check them
+    static = True
+
     def __init__(self, game, x, y):
         """
         Parameters
@@ -891,43 +1190,27 @@ class HealthDrop(sprite.Sprite):
         super().__init__()
         self.game = game
         self.load_images()
-        self.last_update = 0
+        self.animator = Animator()
         self.image = self.frames[0]
-        self.current_frame = 0
         # physics variables
         self.rect = self.image.get_rect()
         self.rect.midbottom = (x, y)
 
     @debug
     def load_images(self):
-        """loads frames from xml file descripting positions of each frame on the spritesheet."""
-        def load_sprite_positions(xmldata):
-            """
-            returns a list of (x,y,w,h) tuples descripting the dimensions of each frame.
-
-            Parameters
-            ----------
-            xmldata -> xml file to be parsed for frame data
-
-            Tests
-            -----
-            * passing valid xmldata
-            * passing invalid xmldata"""
-
-            sprites = xmldata.findall("sprite")
-            sprites_list = []
-            for sprite in sprites:
-                spriteinfo = (int(sprite.get("x")), int(sprite.get("y")), int(
-                    sprite.get("w")), int(sprite.get("h")))
-                sprites_list.append(spriteinfo)
-            return sprites_list
-
-        load = self.game.healthdrop_spritesheet.get_image
-        # load frames
-        self.frames = [
-            load(*frame) for frame in load_sprite_positions(self.game.healthdrop_xmldata)]
-        # set colorkeys
-        [frame.set_colorkey(BLACK) for frame in self.frames]
+        """takes the frames and the animation from the game's asset registry, see `build_frames()`"""
+        self.frames = self.game.assets.get("healthdrop")
+        self.animation = self.game.assets.get("healthdrop_animation")
+
+    @staticmethod
+    def build_frames(game) -> list:
+        """returns all frames of the healthdrop spritesheet, they are cut out by its frame table"""
+        return game.healthdrop_spritesheet.get_frames("tile")
+
+    @staticmethod
+    def build_animation(game) -> Animation:
+        """returns the looping animation of the healthdrop frames"""
+        return Animation(game.assets.get("healthdrop"), 50)
 
     def animate(self):
         """animates an object
@@ -937,26 +1220,13 @@ class HealthDrop(sprite.Sprite):
         * missing local variable of the object
         * frames not being a list of pygame.Surface
         """
-        now = pg.time.get_ticks()
-
-        def show_continuous_animation(frame_list):
-            """loops through the frame_list
-            
-            Tests
-            -----
-            * not passing a list
-            * missing variables"""
-            self.last_update = now
-            self.current_frame = (self.current_frame + 1) % len(frame_list)
-            self.image = frame_list[self.current_frame]
+        image = self.animator.play(self.animation, self.game.get_ticks())
+        if image is not None:
+            self.image = image
             midbottom = self.rect.midbottom
-            self.rect = self.image.get_rect()
+            self.rect.size = image.get_size()
             self.rect.midbottom = midbottom
 
-        # show animation
-        if now - self.last_update > 50:
-            show_continuous_animation(self.frames)
-
     def update(self):
         """updates an object
 
@@ -964,7 +1234,8 @@ class HealthDrop(sprite.Sprite):
         -----
         * missing function
         * problem with animate"""
-        self.animate()
+        if self.game.is_visible(self):
+            self.animate()
 
 
 class TiledPlatform(sprite.Sprite):
@@ -0,0 +1,168 @@
+import string
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+import pygame as pg
+from pygame import Rect, Surface
+
+from settings import FONT_ARCADE_IN, FONT_ARCADE_OUT, TEXT_CACHE_SIZE
+
+__doc__ = """
+    Author: Mouaz Tabboush
+
+    textrender - Renders text once and reuses it
+    ============================================
+
+    Rendering text means parsing a font file and rasterizing every character.
+    TextEngine keeps the work that can be reused:
+
+    * fonts are opened once for every path and size
+    * rendered strings are kept in a least recently used cache of TEXT_CACHE_SIZE entries
+    * for text that changes every frame, like counters, a GlyphAtlas renders every character once,
+      drawing a text is then one blit per character
+
+    Requirements
+    ============
+    * pygame
+    * settings
+"""
+
+# characters that are put into a glyph atlas
+GLYPHS = string.digits + string.ascii_letters + string.punctuation + " "
+
+
+class GlyphAtlas:
+    """
+    All characters of one font, size and color rendered into one surface.
+
+    Characters are drawn next to each other without kerning,
+    characters that are not inside the atlas are drawn as "?".
+    """
+
+    def __init__(self, render: Callable[[str], Surface], characters: str = GLYPHS):
+        """
+        Parameters
+        ----------
+        render: function that renders a single character
+        characters: the characters to put into the atlas
+
+        Tests
+        -----
+        * render returning surfaces of different heights
+        * characters without "?"
+        """
+        glyphs = {character: render(character) for character in dict.fromkeys(characters + "?")}
+        self.height = max(glyph.get_height() for glyph in glyphs.values())
+        alpha = any(glyph.get_flags() & pg.SRCALPHA for glyph in glyphs.values())
+        self.atlas = Surface((sum(glyph.get_width() for glyph in glyphs.values()), self.height),
+                             pg.SRCALPHA if alpha else 0)
+        self.rects: Dict[str, Rect] = {}
+        x = 0
+        for character, glyph in glyphs.items():
+            self.atlas.blit(glyph, (x, 0))
+            self.rects[character] = Rect(x, 0, glyph.get_width(), glyph.get_height())
+            x += glyph.get_width()
+        if pg.display.get_surface() is not None:
+            self.atlas = self.atlas.convert_alpha() if alpha else self.atlas.convert()
+
+    def size(self, text: str) -> Tuple[int, int]:
+        """returns the width and height the text takes up"""
+        unknown = self.rects["?"]
+        return sum(self.rects.get(character, unknown).width for character in text), self.height
+
+    def draw(self, surface: Surface, text: str, x: int, y: int) -> Rect:
+        """draws a text with its top left corner at x, y and returns the rect it covers
+
+        Tests
+        -----
+        * passing an empty text
+        * passing characters that are not inside the atlas"""
+        unknown = self.rects["?"]
+        blits = []
+        left = x
+        for character in text:
+            area = self.rects.get(character, unknown)
+            blits.append((self.atlas, (left, y), area))
+            left += area.width
+        surface.blits(blits, False)
+        return Rect(x, y, left - x, self.height)
+
+
+class TextEngine:
+    """
+    Caches fonts, rendered strings and glyph atlases.
+
+    The surfaces it returns are shared, they must not be changed.
+    """
+
+    def __init__(self, cache_size: int = TEXT_CACHE_SIZE):
+        """
+        Parameters
+        ----------
+        cache_size: how many rendered strings are kept
+
+        Tests
+        -----
+        * pygame.font not initialized
+        * passing a cache_size of 0"""
+        self.cache_size = cache_size
+        self.fonts = {}
+        self.rendered = OrderedDict()
+        self.atlases = {}
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, path: str, size: int) -> pg.font.Font:
+        """returns the font of a file in a size, the file is only read the first time
+
+        Tests
+        -----
+        * file doesn't exist"""
+        key = (path, size)
+        font = self.fonts.get(key)
+        if font is None:
+            font = self.fonts[key] = pg.font.Font(path, size)
+        return font
+
+    def render_arcade(self, text: str, size: int, color: Tuple[tuple, tuple]) -> Surface:
+        """renders text with the inside of the arcade font in color[0]
+        and its outline in color[1] on a black surface, without caching it"""
+        text_in_surface = self.font(FONT_ARCADE_IN, size).render(text, True, color[0])
+        text_out_surface = self.font(FONT_ARCADE_OUT, size).render(text, True, color[1])
+        text_surface = Surface(text_in_surface.get_size())
+        text_surface.blit(text_in_surface, (0, 0))
+        text_surface.blit(text_out_surface, (0, 0))
+        return text_surface
+
+    def render(self, text: str, size: int, color: Tuple[tuple, tuple]) -> Surface:
+        """like `render_arcade()`, but each text is only rendered once
+        as long as it is one of the last cache_size texts that were rendered
+
+        Tests
+        -----
+        * passing lists as colors"""
+        key = (text, size, tuple(map(tuple, color)))
+        text_surface = self.rendered.get(key)
+        if text_surface is not None:
+            self.hits += 1
+            self.rendered.move_to_end(key)
+            return text_surface
+        self.misses += 1
+        text_surface = self.rendered[key] = self.render_arcade(text, size, color)
+        if len(self.rendered) > self.cache_size:
+            self.rendered.popitem(last=False)
+        return text_surface
+
+    def glyphs(self, size: int, color: Tuple[tuple, tuple]) -> GlyphAtlas:
+        """returns the glyph atlas of the arcade font in a size and colors, building it the first time"""
+        key = (size, tuple(map(tuple, color)))
+        atlas = self.atlases.get(key)
+        if atlas is None:
+            atlas = self.atlases[key] = GlyphAtlas(lambda character: self.render_arcade(character, size, color))
+        return atlas
+
+    def clear(self) -> None:
+        """forgets all fonts, rendered strings and glyph atlases"""
+        self.fonts.clear()
+        self.rendered.clear()
+        self.atlases.clear()
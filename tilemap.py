@@ -1,10 +1,22 @@
-from typing import Union
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import xml.etree.ElementTree as ET
+from array import array
+from collections import OrderedDict, namedtuple
+from typing import Dict, List, Tuple, Union
 import pygame as pg
 import pytmx
 from pygame import Rect, Surface
-from pygame.sprite import Sprite
+from pygame.sprite import Group, Sprite
+from pytmx.util_pygame import pygame_image_loader
 
-from settings import CAM_POINT, HEIGHT, WIDTH
+from settings import (CAM_POINT, COLLISION_GRID_CELL_SIZE, COLLISION_TILE_LAYER,
+                      CULLING_GRID_CELL_SIZE, HEIGHT, MAP_CACHE, MAP_CACHE_PATH, MERGE_COLLIDERS,
+                      MAP_CHUNK_CACHE_SIZE, MAP_CHUNK_SIZE, MAP_CHUNKED,
+                      MAP_COMPILED, WIDTH)
 from util import print_log
 
 __doc__ = """
@@ -17,14 +29,36 @@ __doc__ = """
 
     The layout of the map and where each object is are saved inside the tmx file.
 
-    The Script also contains the Camera class which applies offset to game objects.
+    The Script also contains the Camera class which applies offset to game objects,
+    and the SpatialGrid class which speeds up collision checks against the static platforms.
+    CullingGroup keeps moving sprites in a SpriteGrid, so only the sprites close to the camera are drawn.
+
+    Big maps are not rendered on one surface. MapChunks splits the map into square chunks,
+    renders a chunk the first time it is seen and only keeps a limited number of chunks in memory.
+
+    Rendered chunks can be baked into a cache file inside `./maps/cache`. The file is named after
+    a hash of the tmx file, its tilesets and their images, so it is rebuilt when any of them change.
+    BakedMapChunks reads the chunks from a memory mapped cache file instead of rendering them.
+    Run `python bake.py` to bake all maps ahead of time.
+
+    Parsing a tmx file with pytmx is slow, so maps are compiled into a binary level file
+    (see `compile_level()`) that holds the tile layers as typed arrays and the objects as packed records.
+    CompiledMap loads such a file and can be used in place of a pytmx.TiledMap.
+
+    The platforms of a map are merged into as few rectangles as possible when the level is loaded
+    (see `level_colliders()`), the merged colliders are stored inside the compiled level file.
 
 
     Requirements
     ============
     
     * pygame
-    * pytmx     
+    * pytmx
+    * hashlib
+    * mmap
+    * struct
+    * array
+    * xml.etree.ElementTree
 """
 
 
@@ -36,7 +70,9 @@ class TiledMap:
     https://www.youtube.com/watch?v=QIXyj3WeyZM
     """
     def __init__(self, filename):
-        """
+        """reads or compiles the map data, the tile images are loaded by `load_images()`.
+        doesn't need the display, so maps can be read on another thread.
+
         Tests
         -----
         * not passing a correct directory
@@ -44,30 +80,89 @@ class TiledMap:
         * missing variables
         * pytmx not imported
         """
+        self.filename = filename
+        self.cache_file = None
+        self.images_loaded = False
         try:
-            self.tmxdata = pytmx.load_pygame(filename, pixelalpha=True)
+            if MAP_COMPILED:
+                # tile images are only loaded by CompiledMap when they are needed
+                self.tmxdata = load_level(filename)
+                self.source_hash = self.tmxdata.source_hash
+            else:
+                self.source_hash = map_source_hash(map_sources(filename))
+
+            if MAP_CHUNKED and MAP_CACHE:
+                self.cache_file = map_cache_file(filename, self.source_hash)
+
+            if not MAP_COMPILED:
+                # the tile images are only loaded when the map is rendered
+                self.tmxdata = pytmx.TiledMap(filename)
             self.width = self.tmxdata.width * self.tmxdata.tilewidth
             self.height = self.tmxdata.height * self.tmxdata.tileheight
+
+            if MAP_COMPILED:
+                self.colliders = self.tmxdata.colliders
+            else:
+                self.colliders = level_colliders(self.tmxdata)
         except Exception:
             print_log("Failure while loading the map", "ERROR")
             print_log("Please make sure that no assets are missing from the game folder.", "ERROR")
-            pg.quit()
+            # raised on the thread that waits for the map
+            raise
 
+    def load_images(self) -> None:
+        """loads the tile images the same way pytmx.load_pygame(pixelalpha=True) does.
+        the images are converted for the display, so this has to run on the main thread.
+        `render()` calls it the first time it is needed.
 
-    def render(self, surface:Surface):
+        Tests
+        -----
+        * tileset image missing
+        * pygame display not initialized"""
+        if MAP_COMPILED:
+            self.tmxdata.load_images()
+        else:
+            self.tmxdata.image_loader = pygame_image_loader
+            self.tmxdata.reload_images()
+        self.images_loaded = True
+
+    def render(self, surface:Surface, area:Rect=None):
         """renders the tiles from the Tiledmap on a given surface.
 
+        Parameters
+        ----------
+        surface: the surface to render on
+        area: (optional) only the tiles inside this rect of the map are rendered.
+        the tiles are drawn relative to the topleft of the area.
+
         Tests
         -----
         * not passing a surface
+        * passing an area outside of the map
         * problem with local function tile_image"""
+        if not self.images_loaded:
+            self.load_images()
         tile_image = self.tmxdata.get_tile_image_by_gid
+        tilewidth = self.tmxdata.tilewidth
+        tileheight = self.tmxdata.tileheight
+        if area is None:
+            area = Rect(0, 0, self.width, self.height)
+
+        # range of tiles that overlap the area
+        first_x = max(0, area.left // tilewidth)
+        first_y = max(0, area.top // tileheight)
+        last_x = min(self.tmxdata.width, -(-area.right // tilewidth))
+        last_y = min(self.tmxdata.height, -(-area.bottom // tileheight))
+
         for layer in self.tmxdata.visible_layers:
-            if isinstance(layer, pytmx.TiledTileLayer):
-                for x, y, gid in layer:
-                    tile = tile_image(gid)
-                    if tile:
-                        surface.blit(tile, (x * self.tmxdata.tilewidth,y * self.tmxdata.tileheight))
+            if isinstance(layer, (pytmx.TiledTileLayer, CompiledTileLayer)):
+                for y in range(first_y, last_y):
+                    row = layer.data[y]
+                    for x in range(first_x, last_x):
+                        tile = tile_image(row[x])
+                        if tile:
+                            surface.blit(tile, (x * tilewidth - area.x,
+                                                y * tileheight - area.y))
 
     def make_map(self) -> Surface:
         """A Wrapper function that returns a surface of the map.
@@ -80,7 +175,834 @@ class TiledMap:
         temp_surface = Surface((self.width, self.height))
         self.render(temp_surface)
         return temp_surface
-        
+
+    def make_chunks(self) -> "MapChunks":
+        """A Wrapper function that returns the map as lazily rendered chunks.
+        Use this instead of `make_map()` for maps that are too big for one surface.
+
+        When MAP_CACHE is set the chunks are read from the map's cache file,
+        which is baked first if it doesn't exist yet.
+
+        Tests
+        -----
+        * problem with MapChunks
+        * problem with bake_map()
+        * missing variables"""
+        if self.cache_file is None:
+            return MapChunks(self)
+        if not os.path.isfile(self.cache_file):
+            bake_map(self)
+        return BakedMapChunks(self, self.cache_file)
+
+
+class MapChunks:
+    """
+    An Object that renders a TiledMap in square chunks.
+
+    Chunks are rendered the first time they overlap the camera and are kept in a
+    least recently used cache, so the memory used by the map does not grow with its size.
+    """
+    def __init__(self, tiled_map: TiledMap, chunk_size: int = MAP_CHUNK_SIZE,
+                 cache_size: int = MAP_CHUNK_CACHE_SIZE):
+        """
+        Parameters
+        ----------
+        tiled_map: the map to be rendered
+        chunk_size: width and height of a chunk in pixels
+        cache_size: how many rendered chunks are kept in memory
+
+        Tests
+        -----
+        * passing a chunk_size of 0 or less
+        * passing a cache_size smaller than the chunks on the screen"""
+        self.map = tiled_map
+        self.chunk_size = chunk_size
+        self.cache_size = cache_size
+        self.columns = -(-tiled_map.width // chunk_size)
+        self.rows = -(-tiled_map.height // chunk_size)
+        self.chunks = OrderedDict()
+
+    def get_rect(self) -> Rect:
+        """returns the rect of the whole map, like Surface.get_rect()"""
+        return Rect(0, 0, self.map.width, self.map.height)
+
+    def get_chunk(self, column: int, row: int) -> Surface:
+        """returns the chunk at the given position and renders it if needed.
+        the least recently used chunk is dropped when the cache is full.
+
+        Parameters
+        ----------
+        column: x index of the chunk
+        row: y index of the chunk
+
+        Tests
+        -----
+        * passing an index outside of the map
+        * problem with TiledMap.render()"""
+        key = (column, row)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+
+        chunk = self.render_chunk(column, row)
+        self.chunks[key] = chunk
+        if len(self.chunks) > self.cache_size:
+            self.chunks.popitem(last=False)
+        return chunk
+
+    def chunk_area(self, column: int, row: int) -> Rect:
+        """returns the part of the map that is covered by a chunk.
+        chunks at the right and bottom edge can be smaller than chunk_size."""
+        return Rect(column * self.chunk_size, row * self.chunk_size,
+                    self.chunk_size, self.chunk_size).clip(self.get_rect())
+
+    def render_chunk(self, column: int, row: int) -> Surface:
+        """renders the tiles of one chunk on a new surface
+
+        Tests
+        -----
+        * problem with TiledMap.render()"""
+        area = self.chunk_area(column, row)
+        chunk = Surface(area.size)
+        self.map.render(chunk, area)
+        return chunk
+
+    def visible_chunks(self, view: Rect) -> Tuple[int, int, int, int]:
+        """returns the first and last (exclusive) chunk columns and rows that overlap view
+
+        Parameters
+        ----------
+        view: the part of the map that is visible"""
+        size = self.chunk_size
+        first_column = max(0, view.left // size)
+        first_row = max(0, view.top // size)
+        last_column = min(self.columns, -(-view.right // size))
+        last_row = min(self.rows, -(-view.bottom // size))
+        return first_column, first_row, last_column, last_row
+
+    def draw(self, surface: Surface, camera: "Camera") -> None:
+        """blits the chunks that are visible through the camera on the surface
+
+        Parameters
+        ----------
+        surface: the surface to draw on, usually the screen
+        camera: the camera that is used for the offset
+
+        Tests
+        -----
+        * passing a camera that has not been updated
+        * problem with get_chunk()"""
+        offset_x, offset_y = camera.offset
+        first_column, first_row, last_column, last_row = \
+            self.visible_chunks(camera.view_rect)
+        size = self.chunk_size
+        surface.blits([(self.get_chunk(column, row),
+                        (column * size + offset_x, row * size + offset_y))
+                       for row in range(first_row, last_row)
+                       for column in range(first_column, last_column)], False)
+
+
+# layout of a map cache file:
+# header, then an offset for each chunk (row by row), then the raw RGB pixels of each chunk
+MAP_CACHE_MAGIC = b"XMAP"
+MAP_CACHE_VERSION = 1
+MAP_CACHE_HEADER = struct.Struct("<4sIIIIII") # magic, version, width, height, chunk_size, columns, rows
+MAP_CACHE_OFFSET = struct.Struct("<Q")
+
+
+def map_sources(filename: str) -> List[str]:
+    """returns the tmx file and every tileset and image it depends on.
+
+    Parameters
+    ----------
+    filename: path of the tmx file
+
+    Tests
+    -----
+    * passing a file that is not a tmx file
+    * tileset that is embedded inside the tmx file
+    * tileset that is missing"""
+    sources = [filename]
+    root = ET.parse(filename).getroot()
+    for tileset in root.findall("tileset"):
+        tileset_root = tileset
+        if tileset.get("source"):
+            tileset_file = os.path.join(os.path.dirname(filename), tileset.get("source"))
+            sources.append(tileset_file)
+            tileset_root = ET.parse(tileset_file).getroot()
+        else:
+            tileset_file = filename
+        for image in tileset_root.iter("image"):
+            sources.append(os.path.join(os.path.dirname(tileset_file), image.get("source")))
+    return sources
+
+
+def file_hash(filename: str) -> str:
+    """returns the sha1 hash of a file's content
+
+    Tests
+    -----
+    * passing a file that doesn't exist"""
+    with open(filename, "rb") as fh:
+        return hashlib.sha1(fh.read()).hexdigest()
+
+
+def map_source_hash(sources: List[str]) -> str:
+    """returns one hash for all the files a map depends on
+
+    Parameters
+    ----------
+    sources: the files returned by `map_sources()`
+
+    Tests
+    -----
+    * one of the sources is missing"""
+    return hashlib.sha1("".join(file_hash(source) for source in sources).encode()).hexdigest()
+
+
+def map_cache_file(filename: str, source_hash: str, chunk_size: int = MAP_CHUNK_SIZE) -> str:
+    """returns the path of the cache file for a tmx file.
+    the name contains the hash of all the files the map depends on,
+    so changing any of them results in a new cache file.
+
+    Parameters
+    ----------
+    filename: path of the tmx file
+    source_hash: the hash returned by `map_source_hash()`
+    chunk_size: size of the chunks that are stored in the cache
+
+    Tests
+    -----
+    * passing a file that doesn't exist"""
+    name = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(MAP_CACHE_PATH, f"{name}-{source_hash[:16]}-{chunk_size}.chunks")
+
+
+def remove_old_cache_files(filename: str, cache_file: str) -> None:
+    """removes cache files that belong to older versions of the same map
+
+    Parameters
+    ----------
+    filename: path of the tmx file
+    cache_file: the cache file that is kept
+
+    Tests
+    -----
+    * ./maps/cache missing"""
+    name = os.path.basename(cache_file)
+    prefix = os.path.splitext(os.path.basename(filename))[0] + "-"
+    extension = os.path.splitext(name)[1]
+    for old_file in os.listdir(MAP_CACHE_PATH):
+        if old_file.startswith(prefix) and old_file.endswith(extension)\
+                and old_file != name:
+            os.remove(os.path.join(MAP_CACHE_PATH, old_file))
+
+
+def bake_map(tiled_map: TiledMap, chunk_size: int = MAP_CHUNK_SIZE) -> str:
+    """renders every chunk of a map and writes them to the map's cache file.
+    old cache files of the same map are removed.
+
+    The map needs to be able to load its tile images.
+
+    Parameters
+    ----------
+    tiled_map: the map to be baked
+    chunk_size: width and height of a chunk in pixels
+
+    Tests
+    -----
+    * passing a map loaded without tile images
+    * ./maps/cache not writable
+    * problem with MapChunks.render_chunk()"""
+    cache_file = map_cache_file(tiled_map.filename, tiled_map.source_hash, chunk_size)
+    print_log(f"<tilemap.bake_map>:baking {os.path.basename(cache_file)}")
+    os.makedirs(MAP_CACHE_PATH, exist_ok=True)
+
+    chunks = MapChunks(tiled_map, chunk_size)
+    count = chunks.columns * chunks.rows
+    offset = MAP_CACHE_HEADER.size + count * MAP_CACHE_OFFSET.size
+    offsets = []
+    for row in range(chunks.rows):
+        for column in range(chunks.columns):
+            offsets.append(offset)
+            area = chunks.chunk_area(column, row)
+            offset += area.width * area.height * 3
+
+    temp_file = cache_file + ".tmp"
+    with open(temp_file, "wb") as fh:
+        fh.write(MAP_CACHE_HEADER.pack(MAP_CACHE_MAGIC, MAP_CACHE_VERSION,
+                                       tiled_map.width, tiled_map.height,
+                                       chunk_size, chunks.columns, chunks.rows))
+        for offset in offsets:
+            fh.write(MAP_CACHE_OFFSET.pack(offset))
+        # chunks are rendered one by one, so the whole map is never in memory
+        for row in range(chunks.rows):
+            for column in range(chunks.columns):
+                fh.write(pg.image.tostring(chunks.render_chunk(column, row), "RGB"))
+    os.replace(temp_file, cache_file)
+
+    remove_old_cache_files(tiled_map.filename, cache_file)
+
+    print_log(f"<tilemap.bake_map>:baked {count} chunks", "SUCCESS")
+    return cache_file
+
+
+class BakedMapChunks(MapChunks):
+    """
+    MapChunks that are read from a memory mapped cache file created by `bake_map()`
+    instead of being rendered from the tiles.
+    """
+    def __init__(self, tiled_map: TiledMap, cache_file: str,
+                 cache_size: int = MAP_CHUNK_CACHE_SIZE):
+        """
+        Parameters
+        ----------
+        tiled_map: the map the cache file belongs to
+        cache_file: path of the cache file
+        cache_size: how many decoded chunks are kept in memory
+
+        Tests
+        -----
+        * passing a file that is not a map cache file
+        * passing a cache file of an older version"""
+        with open(cache_file, "rb") as fh:
+            self.data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, width, height, chunk_size, columns, rows = \
+            MAP_CACHE_HEADER.unpack_from(self.data)
+        if magic != MAP_CACHE_MAGIC or version != MAP_CACHE_VERSION\
+                or (width, height) != (tiled_map.width, tiled_map.height):
+            raise ValueError(f"{cache_file} is not a valid cache for {tiled_map.filename}")
+        super().__init__(tiled_map, chunk_size, cache_size)
+        self.offsets = [offset for offset, in MAP_CACHE_OFFSET.iter_unpack(
+            self.data[MAP_CACHE_HEADER.size:
+                      MAP_CACHE_HEADER.size + columns * rows * MAP_CACHE_OFFSET.size])]
+
+    def render_chunk(self, column: int, row: int) -> Surface:
+        """reads the pixels of one chunk from the cache file
+
+        Tests
+        -----
+        * cache file got truncated"""
+        area = self.chunk_area(column, row)
+        start = self.offsets[row * self.columns + column]
+        end = start + area.width * area.height * 3
+        return pg.image.fromstring(self.data[start:end], area.size, "RGB").convert()
+
+
+def greedy_mesh(solid: List[List[bool]], xs: List[int], ys: List[int]) -> List[Tuple[int, int, int, int]]:
+    """merges the solid cells of a grid into as few rectangles as possible.
+    each rectangle is grown to the right first and then downwards, as long as all cells are solid.
+
+    Parameters
+    ----------
+    solid: solid[row][column] is True if the cell is solid
+    xs: x coordinate of every column border, one more than there are columns
+    ys: y coordinate of every row border, one more than there are rows
+
+    Tests
+    -----
+    * passing an empty grid
+    * grid completely solid
+    * passing xs or ys that don't match the grid"""
+    rows = len(solid)
+    columns = len(xs) - 1
+    used = [[False] * columns for _ in range(rows)]
+    rects = []
+    for row in range(rows):
+        for column in range(columns):
+            if not solid[row][column] or used[row][column]:
+                continue
+            # grow to the right
+            end_column = column + 1
+            while end_column < columns and solid[row][end_column] and not used[row][end_column]:
+                end_column += 1
+            # grow downwards while the whole span is solid
+            end_row = row + 1
+            while end_row < rows and all(solid[end_row][x] and not used[end_row][x]
+                                         for x in range(column, end_column)):
+                end_row += 1
+            for y in range(row, end_row):
+                for x in range(column, end_column):
+                    used[y][x] = True
+            rects.append((xs[column], ys[row],
+                          xs[end_column] - xs[column], ys[end_row] - ys[row]))
+    return rects
+
+
+def join_rects(rects: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """joins pairs of rectangles whose union is a rectangle again, until no pair is left.
+    unlike `greedy_mesh()` the result can overlap, but never has more rectangles than the input.
+
+    Parameters
+    ----------
+    rects: list of (x, y, w, h)
+
+    Tests
+    -----
+    * passing rects that contain each other
+    * passing rects that only touch at a corner"""
+    def join(a, b):
+        """returns the union of a and b if it is a rectangle, None otherwise"""
+        ax, ay, aw, ah = a
+        bx, by, bw, bh = b
+        if bx >= ax and by >= ay and bx + bw <= ax + aw and by + bh <= ay + ah:
+            return a
+        if ax >= bx and ay >= by and ax + aw <= bx + bw and ay + ah <= by + bh:
+            return b
+        if ay == by and ah == bh and ax <= bx + bw and bx <= ax + aw:
+            left = min(ax, bx)
+            return left, ay, max(ax + aw, bx + bw) - left, ah
+        if ax == bx and aw == bw and ay <= by + bh and by <= ay + ah:
+            top = min(ay, by)
+            return ax, top, aw, max(ay + ah, by + bh) - top
+        return None
+
+    rects = list(rects)
+    joined = True
+    while joined:
+        joined = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                union = join(rects[i], rects[j])
+                if union is not None:
+                    rects[i] = union
+                    del rects[j]
+                    joined = True
+                    break
+            if joined:
+                break
+    return rects
+
+
+def merge_rects(rects: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """merges adjacent and overlapping rectangles into as few rectangles as possible.
+    the result covers exactly the same area.
+
+    Both `greedy_mesh()` and `join_rects()` are tried and the smaller result is returned.
+
+    Parameters
+    ----------
+    rects: list of (x, y, w, h)
+
+    Tests
+    -----
+    * passing rects with a width or height of 0
+    * passing rects that don't touch"""
+    rects = [rect for rect in rects if rect[2] > 0 and rect[3] > 0]
+    if not rects:
+        return []
+    # only the coordinates where a rect starts or ends matter
+    xs = sorted({x for rect in rects for x in (rect[0], rect[0] + rect[2])})
+    ys = sorted({y for rect in rects for y in (rect[1], rect[1] + rect[3])})
+    column_index = {x: i for i, x in enumerate(xs)}
+    row_index = {y: i for i, y in enumerate(ys)}
+    solid = [[False] * (len(xs) - 1) for _ in range(len(ys) - 1)]
+    for x, y, w, h in rects:
+        for row in range(row_index[y], row_index[y + h]):
+            for column in range(column_index[x], column_index[x + w]):
+                solid[row][column] = True
+
+    meshed = greedy_mesh(solid, xs, ys)
+    joined = join_rects(rects)
+    return meshed if len(meshed) < len(joined) else joined
+
+
+def level_colliders(tmxdata, merge: bool = MERGE_COLLIDERS,
+                    tile_layer: str = COLLISION_TILE_LAYER) -> List[Tuple[int, int, int, int]]:
+    """returns the colliders of a map as a list of (x, y, w, h).
+
+    The colliders are the objects named "platform". If tile_layer is set,
+    every tile of the layer with that name is solid as well.
+
+    Parameters
+    ----------
+    tmxdata: a pytmx.TiledMap or CompiledMap
+    merge: merge the colliders with `merge_rects()`
+    tile_layer: (optional) name of a tile layer whose tiles are solid
+
+    Tests
+    -----
+    * passing a tile_layer that doesn't exist
+    * map without platforms"""
+    # TiledPlatform used to turn the positions into ints the same way
+    rects = [(int(obj.x), int(obj.y), int(obj.width), int(obj.height))
+             for obj in tmxdata.objects if obj.name == "platform"]
+
+    if tile_layer is not None:
+        for layer in tmxdata.layers:
+            if layer.name == tile_layer and hasattr(layer, "data"):
+                solid = [[bool(gid) for gid in row] for row in layer.data]
+                xs = [x * tmxdata.tilewidth for x in range(tmxdata.width + 1)]
+                ys = [y * tmxdata.tileheight for y in range(tmxdata.height + 1)]
+                rects += greedy_mesh(solid, xs, ys)
+
+    if merge:
+        return merge_rects(rects)
+    return rects
+
+
+def colliders_key(merge: bool = MERGE_COLLIDERS, tile_layer: str = COLLISION_TILE_LAYER) -> str:
+    """returns a string describing the collider settings, stored inside compiled levels"""
+    return f"merge={merge};tile_layer={tile_layer}"
+
+
+# layout of a compiled level file:
+# header, string table, dependencies (tsx and image files with their hashes),
+# tileset images, one record per tile gid, the layers in the order of the tmx file, then the colliders.
+# tile layers hold their gids as a typed array, object groups hold one packed record per object.
+LEVEL_MAGIC = b"XLVL"
+LEVEL_VERSION = 2
+LEVEL_HEADER = struct.Struct("<4sIIIIIIIIIIiI") # magic, version, width, height, tilewidth, tileheight,
+                                               # strings, dependencies, sources, tiles, layers,
+                                               # colliders key, colliders
+LEVEL_STRING = struct.Struct("<H")            # length of the utf-8 string that follows
+LEVEL_PAIR = struct.Struct("<ii")             # dependency: path, hash / source: path, colorkey
+LEVEL_TILE = struct.Struct("<iiiiiB")         # source, x, y, w, h, flags
+LEVEL_LAYER = struct.Struct("<BiBcI")         # kind, name, visible, typecode, length
+LEVEL_OBJECT = struct.Struct("<iiiiBdddd")    # id, gid, name, type, visible, x, y, width, height
+LEVEL_COLLIDER = struct.Struct("<iiii")       # x, y, w, h
+
+LEVEL_TILE_LAYER = 0
+LEVEL_OBJECT_GROUP = 1
+
+# bits of the tile flags
+TILE_FLIPPED_H = 1
+TILE_FLIPPED_V = 2
+TILE_FLIPPED_D = 4
+TILE_HAS_FLAGS = 8
+TILE_HAS_RECT = 16
+
+LevelObject = namedtuple("LevelObject",
+                         ["id", "gid", "name", "type", "visible", "x", "y", "width", "height"])
+
+
+def level_file(filename: str, tmx_hash: str) -> str:
+    """returns the path of the compiled level file for a tmx file
+
+    Parameters
+    ----------
+    filename: path of the tmx file
+    tmx_hash: the hash of the tmx file"""
+    name = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(MAP_CACHE_PATH, f"{name}-{tmx_hash[:16]}.level")
+
+
+def compile_level(filename: str, level: str) -> None:
+    """parses a tmx file with pytmx and writes it as a compiled level file.
+
+    the tiles are recorded with a fake image loader, so the gids and tile images
+    of the compiled level are exactly the ones pytmx would use.
+
+    Parameters
+    ----------
+    filename: path of the tmx file
+    level: path of the level file to be written
+
+    Tests
+    -----
+    * passing an invalid tmx file
+    * map using a tileset without an image
+    * ./maps/cache not writable"""
+    print_log(f"<tilemap.compile_level>:compiling {os.path.basename(filename)}")
+    map_dir = os.path.dirname(filename)
+    strings = {}
+
+    def string(value) -> int:
+        """returns the index of a string inside the string table, -1 for None"""
+        if value is None:
+            return -1
+        return strings.setdefault(str(value), len(strings))
+
+    sources = []
+
+    def record_loader(path, colorkey, **kwargs):
+        """image loader for pytmx that records where each tile comes from"""
+        source = len(sources)
+        sources.append((os.path.relpath(path, map_dir).replace(os.sep, "/"), colorkey))
+
+        def load_image(rect=None, flags=None):
+            return source, rect, flags
+        return load_image
+
+    tmxdata = pytmx.TiledMap(filename, image_loader=record_loader)
+
+    dependencies = [(string(os.path.relpath(path, map_dir).replace(os.sep, "/")),
+                     string(file_hash(path)))
+                    for path in map_sources(filename)[1:]]
+    source_records = [(string(path), string(colorkey)) for path, colorkey in sources]
+
+    tile_records = []
+    for image in tmxdata.images:
+        if image is None:
+            tile_records.append((-1, 0, 0, 0, 0, 0))
+            continue
+        source, rect, flags = image
+        bits = 0
+        if rect:
+            bits |= TILE_HAS_RECT
+        else:
+            rect = (0, 0, 0, 0)
+        if flags is not None:
+            bits |= TILE_HAS_FLAGS
+            bits |= TILE_FLIPPED_H if flags.flipped_horizontally else 0
+            bits |= TILE_FLIPPED_V if flags.flipped_vertically else 0
+            bits |= TILE_FLIPPED_D if flags.flipped_diagonally else 0
+        tile_records.append((source, *rect, bits))
+
+    typecode = "H" if len(tmxdata.images) <= 0xFFFF else "I"
+    layer_records = []
+    for layer in tmxdata.layers:
+        if isinstance(layer, pytmx.TiledTileLayer):
+            gids = array(typecode, (gid for row in layer.data for gid in row))
+            if sys.byteorder == "big":
+                gids.byteswap()
+            layer_records.append((LEVEL_LAYER.pack(LEVEL_TILE_LAYER, string(layer.name),
+                                                   bool(layer.visible), typecode.encode(),
+                                                   len(gids)), gids.tobytes()))
+        elif isinstance(layer, pytmx.TiledObjectGroup):
+            objects = b"".join(LEVEL_OBJECT.pack(obj.id or 0, obj.gid or 0,
+                                                 string(obj.name), string(getattr(obj, "type", None)),
+                                                 bool(obj.visible), obj.x, obj.y,
+                                                 obj.width, obj.height)
+                               for obj in layer)
+            layer_records.append((LEVEL_LAYER.pack(LEVEL_OBJECT_GROUP, string(layer.name),
+                                                   bool(layer.visible), b"-", len(layer)),
+                                  objects))
+        else:
+            print_log(f"<tilemap.compile_level>:skipping layer {layer.name}", "WARNING")
+
+    colliders = level_colliders(tmxdata)
+    colliders_setting = string(colliders_key())
+
+    os.makedirs(MAP_CACHE_PATH, exist_ok=True)
+    temp_file = level + ".tmp"
+    with open(temp_file, "wb") as fh:
+        fh.write(LEVEL_HEADER.pack(LEVEL_MAGIC, LEVEL_VERSION, tmxdata.width, tmxdata.height,
+                                   tmxdata.tilewidth, tmxdata.tileheight, len(strings),
+                                   len(dependencies), len(source_records),
+                                   len(tile_records), len(layer_records),
+                                   colliders_setting, len(colliders)))
+        for value in strings:
+            encoded = value.encode("utf-8")
+            fh.write(LEVEL_STRING.pack(len(encoded)) + encoded)
+        for record in dependencies + source_records:
+            fh.write(LEVEL_PAIR.pack(*record))
+        for record in tile_records:
+            fh.write(LEVEL_TILE.pack(*record))
+        for header, data in layer_records:
+            fh.write(header + data)
+        for collider in colliders:
+            fh.write(LEVEL_COLLIDER.pack(*collider))
+    os.replace(temp_file, level)
+    remove_old_cache_files(filename, level)
+    print_log("<tilemap.compile_level>:compiled successfully", "SUCCESS")
+
+
+def load_level(filename: str) -> "CompiledMap":
+    """returns the compiled level of a tmx file.
+    the level is compiled first if it doesn't exist or one of the files it depends on has changed.
+
+    Parameters
+    ----------
+    filename: path of the tmx file
+
+    Tests
+    -----
+    * passing a file that doesn't exist
+    * problem with compile_level()"""
+    tmx_hash = file_hash(filename)
+    level = level_file(filename, tmx_hash)
+    if os.path.isfile(level):
+        try:
+            compiled_map = CompiledMap(filename, level, tmx_hash)
+            if compiled_map.is_up_to_date():
+                return compiled_map
+        except ValueError:
+            print_log(f"<tilemap.load_level>:{os.path.basename(level)} is outdated", "WARNING")
+    compile_level(filename, level)
+    return CompiledMap(filename, level, tmx_hash)
+
+
+class CompiledTileLayer:
+    """A tile layer of a CompiledMap. data can be indexed like pytmx's `layer.data[y][x]`"""
+    def __init__(self, name: str, visible: bool, width: int, gids: array):
+        """
+        Parameters
+        ----------
+        name: name of the layer
+        visible: if the layer is rendered
+        width: number of tiles in a row
+        gids: the gid of every tile, row by row"""
+        self.name = name
+        self.visible = visible
+        self.width = width
+        self.height = len(gids) // width
+        self.gids = gids
+        view = memoryview(gids)
+        self.data = [view[y * width:(y + 1) * width] for y in range(self.height)]
+
+    def __iter__(self):
+        """yields (x, y, gid) for every tile, like pytmx.TiledTileLayer"""
+        for y, row in enumerate(self.data):
+            for x, gid in enumerate(row):
+                yield x, y, gid
+
+
+class CompiledObjectGroup(list):
+    """An object group of a CompiledMap, a list of LevelObjects"""
+    def __init__(self, name: str, visible: bool, objects: List[LevelObject]):
+        """
+        Parameters
+        ----------
+        name: name of the group
+        visible: if the group is visible
+        objects: the objects of the group"""
+        super().__init__(objects)
+        self.name = name
+        self.visible = visible
+
+
+class CompiledMap:
+    """
+    CompiledMap - Map data loaded from a compiled level file.
+
+    Provides the parts of pytmx.TiledMap that the game uses, without parsing any xml.
+    Tile images are only loaded the first time `get_tile_image_by_gid()` is called.
+    """
+    def __init__(self, filename: str, level: str, tmx_hash: str):
+        """
+        Parameters
+        ----------
+        filename: path of the tmx file the level was compiled from
+        level: path of the compiled level file
+        tmx_hash: the hash of the tmx file
+
+        Tests
+        -----
+        * passing a file that is not a level file
+        * passing a level file of an older version"""
+        self.filename = filename
+        self.tmx_hash = tmx_hash
+        with open(level, "rb") as fh:
+            data = fh.read()
+
+        magic, version, self.width, self.height, self.tilewidth, self.tileheight, \
+            string_count, dependency_count, source_count, tile_count, layer_count, \
+            colliders_setting, collider_count = LEVEL_HEADER.unpack_from(data)
+        if magic != LEVEL_MAGIC or version != LEVEL_VERSION:
+            raise ValueError(f"{level} is not a valid level file")
+        offset = LEVEL_HEADER.size
+
+        strings = []
+        for _ in range(string_count):
+            length, = LEVEL_STRING.unpack_from(data, offset)
+            offset += LEVEL_STRING.size
+            strings.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+
+        def string(index: int):
+            return None if index < 0 else strings[index]
+
+        pairs = [(string(first), string(second)) for first, second in
+                 LEVEL_PAIR.iter_unpack(data[offset:offset + (dependency_count + source_count)
+                                             * LEVEL_PAIR.size])]
+        offset += len(pairs) * LEVEL_PAIR.size
+        self.dependencies = pairs[:dependency_count]
+        self.sources = pairs[dependency_count:]
+
+        self.tiles = list(LEVEL_TILE.iter_unpack(data[offset:offset + tile_count * LEVEL_TILE.size]))
+        offset += tile_count * LEVEL_TILE.size
+        self.images = None
+
+        self.layers = []
+        for _ in range(layer_count):
+            kind, name, visible, typecode, length = LEVEL_LAYER.unpack_from(data, offset)
+            offset += LEVEL_LAYER.size
+            if kind == LEVEL_TILE_LAYER:
+                gids = array(typecode.decode())
+                gids.frombytes(data[offset:offset + length * gids.itemsize])
+                if sys.byteorder == "big":
+                    gids.byteswap()
+                offset += length * gids.itemsize
+                self.layers.append(CompiledTileLayer(string(name), bool(visible), self.width, gids))
+            else:
+                objects = [LevelObject(obj_id, gid, string(obj_name), string(obj_type),
+                                       bool(obj_visible), x, y, w, h)
+                           for obj_id, gid, obj_name, obj_type, obj_visible, x, y, w, h in
+                           LEVEL_OBJECT.iter_unpack(data[offset:offset + length * LEVEL_OBJECT.size])]
+                offset += length * LEVEL_OBJECT.size
+                self.layers.append(CompiledObjectGroup(string(name), bool(visible), objects))
+
+        self.colliders_key = string(colliders_setting)
+        self.colliders = list(LEVEL_COLLIDER.iter_unpack(
+            data[offset:offset + collider_count * LEVEL_COLLIDER.size]))
+
+    @property
+    def visible_layers(self):
+        """yields the visible layers, like pytmx.TiledMap.visible_layers"""
+        return (layer for layer in self.layers if layer.visible)
+
+    @property
+    def objects(self):
+        """yields the objects of every object group, like pytmx.TiledMap.objects"""
+        for layer in self.layers:
+            if isinstance(layer, CompiledObjectGroup):
+                yield from layer
+
+    @property
+    def source_hash(self) -> str:
+        """the same hash `map_source_hash()` returns for the tmx file and its dependencies.
+        only valid if `is_up_to_date()` returns True"""
+        return hashlib.sha1((self.tmx_hash + "".join(
+            dependency_hash for _, dependency_hash in self.dependencies)).encode()).hexdigest()
+
+    def path(self, relative_path: str) -> str:
+        """returns the path of a file the level refers to"""
+        return os.path.join(os.path.dirname(self.filename), relative_path)
+
+    def is_up_to_date(self) -> bool:
+        """checks if the tilesets, images and collider settings haven't changed since the level was compiled
+
+        Tests
+        -----
+        * a dependency has been deleted"""
+        if self.colliders_key != colliders_key():
+            return False
+        try:
+            return all(file_hash(self.path(path)) == dependency_hash
+                       for path, dependency_hash in self.dependencies)
+        except OSError:
+            return False
+
+    def load_images(self) -> None:
+        """loads the tile images the same way pytmx.load_pygame(pixelalpha=True) does
+
+        Tests
+        -----
+        * tileset image missing
+        * pygame display not initialized"""
+        loaders = [pygame_image_loader(self.path(path), colorkey, pixelalpha=True)
+                   for path, colorkey in self.sources]
+        self.images = [None] * len(self.tiles)
+        for gid, (source, x, y, w, h, bits) in enumerate(self.tiles):
+            if source < 0:
+                continue
+            rect = (x, y, w, h) if bits & TILE_HAS_RECT else None
+            flags = pytmx.TileFlags(bool(bits & TILE_FLIPPED_H), bool(bits & TILE_FLIPPED_V),
+                                    bool(bits & TILE_FLIPPED_D)) if bits & TILE_HAS_FLAGS else None
+            self.images[gid] = loaders[source](rect, flags)
+
+    def get_tile_image_by_gid(self, gid: int) -> Surface:
+        """returns the image of a tile, like pytmx.TiledMap.get_tile_image_by_gid
+
+        Tests
+        -----
+        * passing a gid that doesn't exist"""
+        if self.images is None:
+            self.load_images()
+        return self.images[gid]
+
 
 class Camera:
     """
@@ -103,6 +1025,9 @@ class Camera:
         self.camera = pg.Rect(0, 0, width, height)
         self.width = width
         self.height = height
+        # offset that is applied when drawing, see `interpolate()`
+        self.offset = self.camera.topleft
+        self.previous_offset = self.camera.topleft
 
     def apply(self, entity:Union[Sprite,Rect]) -> Rect:
         """Moves the passed entity or rect by the calculated offset in `update()`
@@ -113,9 +1038,9 @@ class Camera:
         * passed sprites without a rect
         * missing camera rect"""
         if isinstance(entity, pg.sprite.Sprite):
-            return entity.rect.move(self.camera.topleft)
+            return entity.rect.move(self.offset)
         elif isinstance(entity, pg.Rect):
-            return entity.move(self.camera.topleft)
+            return entity.move(self.offset)
 
 
     def update(self, target:Sprite):
@@ -134,6 +1059,227 @@ class Camera:
         y = min(0, y) # top 
         x = max(-(self.width - WIDTH), x) # right
         y = max(-(self.height - HEIGHT), y) # buttom
+        self.previous_offset = self.camera.topleft
         self.camera = Rect(x, y, self.width, self.height)
+        self.offset = self.camera.topleft
+
+    def interpolate(self, alpha: float) -> None:
+        """Sets the offset between the one before and after the last `update()`.
+
+        Parameters
+        ----------
+        alpha: 0.0 for the previous offset, 1.0 for the current one
+
+        Tests
+        -----
+        * passing an alpha outside of 0.0 and 1.0"""
+        previous_x, previous_y = self.previous_offset
+        x, y = self.camera.topleft
+        self.offset = (round(previous_x + (x - previous_x) * alpha),
+                       round(previous_y + (y - previous_y) * alpha))
+
+    @property
+    def view_rect(self) -> Rect:
+        """the part of the map that is currently shown on the window"""
+        return Rect(-self.offset[0], -self.offset[1], WIDTH, HEIGHT)
+
+
+class SpatialGrid:
+    """
+    An Object that sorts static sprites into the cells of a uniform grid,
+    so collision checks only have to look at the sprites close to a rect
+    instead of every sprite in a group.
+    """
+    def __init__(self, cell_size: int = COLLISION_GRID_CELL_SIZE):
+        """
+        Parameters
+        ----------
+        cell_size: width and height of a cell in pixels
+
+        Tests
+        -----
+        * passing a cell_size of 0 or less"""
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[Sprite]] = {}
+        # sprites are returned in the order they were added, like sprite.Group
+        self.order: Dict[Sprite, int] = {}
+
+    def cell_range(self, rect: Rect) -> Tuple[range, range]:
+        """returns the columns and rows of the cells a rect touches"""
+        size = self.cell_size
+        return (range(rect.left // size, (rect.right - 1) // size + 1),
+                range(rect.top // size, (rect.bottom - 1) // size + 1))
 
+    def add(self, *sprites: Sprite) -> None:
+        """adds sprites to every cell their rect touches.
+        the sprites must not move after being added.
 
+        Tests
+        -----
+        * sprite without a rect
+        * adding the same sprite twice"""
+        for entity in sprites:
+            self.order[entity] = len(self.order)
+            columns, rows = self.cell_range(entity.rect)
+            for row in rows:
+                for column in columns:
+                    self.cells.setdefault((column, row), []).append(entity)
+
+    def query(self, rect: Rect) -> List[Sprite]:
+        """returns the sprites inside the cells the rect touches.
+        the sprites don't necessarily collide with the rect.
+
+        Tests
+        -----
+        * passing a rect outside of the grid
+        * passing a rect with a width or height of 0"""
+        columns, rows = self.cell_range(rect)
+        candidates = set()
+        for row in rows:
+            for column in columns:
+                cell = self.cells.get((column, row))
+                if cell:
+                    candidates.update(cell)
+        return sorted(candidates, key=self.order.__getitem__)
+
+    def spritecollide(self, entity: Sprite) -> List[Sprite]:
+        """returns the sprites whose rect collides with the rect of entity.
+        does the same as `sprite.spritecollide(entity, group, False)`
+
+        Tests
+        -----
+        * entity without a rect"""
+        rect = entity.rect
+        return [candidate for candidate in self.query(rect)
+                if rect.colliderect(candidate.rect)]
+
+
+class SpriteGrid(SpatialGrid):
+    """
+    A SpatialGrid for sprites that move or are removed again.
+    The cells a sprite is in are remembered, `move()` sorts it into new cells when its rect changed.
+    """
+    def __init__(self, cell_size: int = CULLING_GRID_CELL_SIZE):
+        """
+        Parameters
+        ----------
+        cell_size: width and height of a cell in pixels
+
+        Tests
+        -----
+        * passing a cell_size of 0 or less"""
+        super().__init__(cell_size)
+        # first column, first row, last column and last row of the cells of every sprite
+        self.bounds: Dict[Sprite, Tuple[int, int, int, int]] = {}
+        # sprites that are added again are returned last, like sprite.Group
+        self.counter = 0
+
+    def cell_bounds(self, rect: Rect) -> Tuple[int, int, int, int]:
+        """returns the first column, first row, last column and last row of the cells a rect touches"""
+        x, y, width, height = rect
+        size = self.cell_size
+        return x // size, y // size, (x + width - 1) // size, (y + height - 1) // size
+
+    def add(self, *sprites: Sprite) -> None:
+        """adds sprites to every cell their rect touches
+
+        Tests
+        -----
+        * sprite without a rect
+        * adding the same sprite twice"""
+        for entity in sprites:
+            self.order[entity] = self.counter
+            self.counter += 1
+            self.bounds[entity] = bounds = self.cell_bounds(entity.rect)
+            self.insert(entity, bounds)
+
+    def remove(self, *sprites: Sprite) -> None:
+        """removes sprites from the grid, sprites that are not inside the grid are ignored"""
+        for entity in sprites:
+            bounds = self.bounds.pop(entity, None)
+            if bounds is not None:
+                self.discard(entity, bounds)
+                del self.order[entity]
+
+    def move(self, *sprites: Sprite) -> None:
+        """sorts sprites into the cells their rect touches now.
+        sprites that stay inside the same cells are not touched.
+
+        Tests
+        -----
+        * sprite that is not inside the grid"""
+        size = self.cell_size
+        all_bounds = self.bounds
+        for entity in sprites:
+            # same as cell_bounds(), but without a call for every sprite
+            x, y, width, height = entity.rect
+            bounds = (x // size, y // size, (x + width - 1) // size, (y + height - 1) // size)
+            old_bounds = all_bounds[entity]
+            if bounds != old_bounds:
+                self.discard(entity, old_bounds)
+                self.insert(entity, bounds)
+                all_bounds[entity] = bounds
+
+    def insert(self, entity: Sprite, bounds: Tuple[int, int, int, int]) -> None:
+        """adds a sprite to the cells returned by `cell_bounds()`"""
+        left, top, right, bottom = bounds
+        for row in range(top, bottom + 1):
+            for column in range(left, right + 1):
+                self.cells.setdefault((column, row), []).append(entity)
+
+    def discard(self, entity: Sprite, bounds: Tuple[int, int, int, int]) -> None:
+        """removes a sprite from the cells returned by `cell_bounds()`, empty cells are removed"""
+        left, top, right, bottom = bounds
+        for row in range(top, bottom + 1):
+            for column in range(left, right + 1):
+                cell = self.cells[(column, row)]
+                cell.remove(entity)
+                if not cell:
+                    del self.cells[(column, row)]
+
+
+class CullingGroup(Group):
+    """
+    A sprite.Group that keeps its sprites inside a SpriteGrid,
+    so the sprites close to a rect can be found without looking at every sprite.
+
+    Sprites with a true `static` attribute must not move while they are inside the group,
+    every other sprite is sorted into its new cells by `update_grid()`.
+    """
+    def __init__(self, *sprites: Sprite, cell_size: int = CULLING_GRID_CELL_SIZE):
+        """
+        Parameters
+        ----------
+        sprites: sprites that are added right away
+        cell_size: width and height of a cell in pixels"""
+        self.grid = SpriteGrid(cell_size)
+        # the sprites that can move, a dict keeps them in the order they were added
+        self.moving: Dict[Sprite, None] = {}
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite: Sprite, layer=None) -> None:
+        """adds a sprite to the group and the grid, called by `Group.add()`"""
+        super().add_internal(sprite, layer)
+        self.grid.add(sprite)
+        if not getattr(sprite, "static", False):
+            self.moving[sprite] = None
+
+    def remove_internal(self, sprite: Sprite) -> None:
+        """removes a sprite from the group and the grid, called by `Group.remove()` and `Sprite.kill()`"""
+        super().remove_internal(sprite)
+        self.grid.remove(sprite)
+        self.moving.pop(sprite, None)
+
+    def update_grid(self) -> None:
+        """sorts the sprites that can move into the cells they are in now,
+        has to be called after the sprites moved"""
+        self.grid.move(*self.moving)
+
+    def sprites_in(self, rect: Rect) -> List[Sprite]:
+        """returns the sprites close to a rect in the order they were added to the group.
+        the sprites don't necessarily collide with the rect.
+
+        Tests
+        -----
+        * passing a rect outside of the map"""
+        return self.grid.query(rect)
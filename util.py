@@ -1,11 +1,20 @@
+import atexit
 import functools
+import json
+import os
+import queue
+import threading
+from collections import deque
 from typing import Tuple
 from datetime import datetime
+from time import perf_counter_ns
 
 import pygame as pg
 from pygame import Surface
 
-from settings import CALLS_DEBUG, LOGGING_TO_CONSOLE, LOGGING_TO_FILE, LOG_INFO, RED
+from settings import (CALLS_DEBUG, LOG_BACKUPS, LOG_FILE, LOG_INFO, LOG_LEVEL,
+                      LOG_MAX_SIZE, LOGGING_TO_CONSOLE, LOGGING_TO_FILE, RED,
+                      TRACE_BUFFER_SIZE, TRACE_FILE, TRACING)
 
 __doc__ = """
     Author: Mouaz Tabboush
@@ -20,14 +29,167 @@ __doc__ = """
 
     * pygame
     * functools
+    * threading
+    * queue
     * typing.Tuple
     * settings.CALLS_DEBUG
+    * settings.TRACING
     * settings.LOGGING
     * settings.RED
 """
 
-def print_log(msg, mode="INFO"):
-    """A wrapper function around print() and open().write()
+class AsyncLogger:
+    """
+    Writes log messages from a background thread.
+
+    Messages are put into a queue together with the time they were logged.
+    The writer thread takes everything that is inside the queue at once,
+    formats it and writes it to the console and the log file with one write.
+    The log file is kept open and moved to `<file>.1` when it gets bigger than max_size.
+    """
+    def __init__(self, filename: str, max_size: int, backups: int,
+                 to_console: bool, to_file: bool):
+        """
+        Parameters
+        ----------
+        filename: path of the log file
+        max_size: size in bytes after which the log file is rotated
+        backups: how many rotated log files are kept
+        to_console: if messages are printed
+        to_file: if messages are written to the log file
+
+        Tests
+        -----
+        * passing a max_size of 0
+        * passing a negative number of backups"""
+        self.filename = filename
+        self.max_size = max_size
+        self.backups = backups
+        self.to_console = to_console
+        self.to_file = to_file
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.fh = None
+
+    def log(self, mode: str, msg, args: tuple) -> None:
+        """hands a message to the writer thread, starting it on the first message"""
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.write_loop,
+                                                   name="logger", daemon=True)
+                    self.thread.start()
+        self.queue.put((mode, msg, args, datetime.now()))
+
+    def flush(self) -> None:
+        """waits until every message logged before this call has been written"""
+        if self.thread is None or not self.thread.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(1.0)
+
+    def write_loop(self) -> None:
+        """runs inside the writer thread, writes the queued messages in batches"""
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [item for item in batch if isinstance(item, tuple)]
+            try:
+                if records:
+                    self.write(records)
+            except Exception as error:
+                # the thread must keep running, otherwise messages pile up inside the queue
+                print(f"<util.AsyncLogger>:can't write {len(records)} log messages ({error!r})")
+            finally:
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        item.set()
+
+    def write(self, records: list) -> None:
+        """formats records and writes them
+
+        Tests
+        -----
+        * log file not writable
+        * passing a message that can't be formatted with its args"""
+        if self.to_console:
+            for mode, msg, args, _ in records:
+                print("\n", mode, ": ", format_message(msg, args))
+        if not self.to_file:
+            return
+        text = "".join(format_record(*record) for record in records)
+        try:
+            if self.fh is None:
+                self.fh = open(self.filename, "a")
+            if self.fh.tell() and self.fh.tell() + len(text) > self.max_size:
+                self.rotate()
+            self.fh.write(text)
+            self.fh.flush()
+        except OSError as error:
+            # logging must never crash the game
+            print(f"<util.AsyncLogger>:can't write {self.filename} ({error}), logging to file is disabled")
+            self.to_file = False
+
+    def rotate(self) -> None:
+        """moves log.txt to log.txt.1, log.txt.1 to log.txt.2 and so on"""
+        self.fh.close()
+        self.fh = None
+        for number in range(self.backups - 1, 0, -1):
+            old = f"{self.filename}.{number}"
+            if os.path.exists(old):
+                os.replace(old, f"{self.filename}.{number + 1}")
+        if self.backups > 0:
+            os.replace(self.filename, f"{self.filename}.1")
+        else:
+            os.remove(self.filename)
+        self.fh = open(self.filename, "a")
+
+
+def format_message(msg, args: tuple) -> str:
+    """applies the args to a message like the % operator, only called by the writer thread.
+    if the args don't fit the message they are appended to it instead
+
+    Tests
+    -----
+    * passing more or less args than the message has placeholders
+    * passing args of the wrong type"""
+    if args:
+        try:
+            return str(msg) % args
+        except (TypeError, ValueError):
+            return f"{msg} {args}"
+    return str(msg)
+
+
+def format_record(mode: str, msg, args: tuple, created: datetime) -> str:
+    """formats a message the way it appears inside the log file"""
+    msg = format_message(msg, args)
+    if not mode=="STARTUP":
+        return "\n"+mode+": "+msg
+    return ("\n\n========================================"
+            f"\n# {mode}: {msg} at {created.strftime('%H:%M:%S')} #"
+            "\n========================================")
+
+
+# modes are ordered by how important they are, unknown modes are always logged
+LOG_MODES = ["INFO", "SUCCESS", "WARNING", "ERROR"]
+SKIPPED_MODES = set(LOG_MODES[:LOG_MODES.index(LOG_LEVEL)])
+if not LOG_INFO:
+    SKIPPED_MODES.add("INFO")
+LOGGING = LOGGING_TO_CONSOLE or LOGGING_TO_FILE
+logger = AsyncLogger(LOG_FILE, LOG_MAX_SIZE, LOG_BACKUPS, LOGGING_TO_CONSOLE, LOGGING_TO_FILE)
+atexit.register(logger.flush)
+
+
+def print_log(msg, mode="INFO", *args):
+    """Logs a message to the console and/or log file.
+    The message is written later by the logger's thread, so calling this is cheap.
     
     Parameters
     ----------
@@ -37,6 +199,9 @@ def print_log(msg, mode="INFO"):
     mode: a tag the is appended to the message.
     useful when handeling logs messages differently.
 
+    args: (optional) values that are put into msg with the % operator,
+    only done if the mode is not skipped
+
     Tests
     -----
     - passing none string objects as a msg
@@ -44,28 +209,71 @@ def print_log(msg, mode="INFO"):
     - if a global variable is missing
     
     """
-    if not LOG_INFO and mode=="INFO":
+    if not LOGGING or mode in SKIPPED_MODES:
         return
+    logger.log(mode, msg, args)
+
+
+def flush_log() -> None:
+    """Blocks until all logged messages are written, called when the game quits."""
+    logger.flush()
+
+
+class Tracer:
+    """
+    Records how long traced function calls take.
+
+    Each call is stored as a span with its start and duration in nanoseconds.
+    Only the last `size` spans are kept.
+    The spans can be saved in Chrome's trace event format and opened in
+    chrome://tracing or https://ui.perfetto.dev
+    """
+    def __init__(self, size: int):
+        """
+        Parameters
+        ----------
+        size: maximum number of spans that are kept"""
+        self.spans = deque(maxlen=size)
+
+    def record(self, name: str, start: int, end: int) -> None:
+        """stores a span, safe to call from any thread"""
+        self.spans.append((name, start, end - start, threading.get_ident()))
+
+    def export(self, filename: str) -> None:
+        """saves the recorded spans as Chrome trace event JSON
+
+        Tests
+        -----
+        * file not writable
+        * nothing recorded"""
+        pid = os.getpid()
+        events = [{"name": name, "cat": "function", "ph": "X",
+                   "ts": start / 1000, "dur": duration / 1000,
+                   "pid": pid, "tid": tid}
+                  for name, start, duration, tid in list(self.spans)]
+        with open(filename, "w") as fh:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fh)
+
+
+tracer = Tracer(TRACE_BUFFER_SIZE)
+
+
+def export_trace() -> None:
+    """Saves the recorded spans to TRACE_FILE when TRACING is set, called when the game quits."""
+    if TRACING:
+        tracer.export(TRACE_FILE)
+        print_log(f"<util.export_trace>:saved {len(tracer.spans)} spans to {TRACE_FILE}", "SUCCESS")
 
-    if LOGGING_TO_CONSOLE:
-        print("\n",mode,": ",msg)
-
-    if LOGGING_TO_FILE:
-        with open("log.txt", "a") as fh:
-            if not mode=="STARTUP":
-                    fh.write("\n"+mode+": "+msg)
-            else:
-                    fh.write("\n\n========================================")
-                    fh.write(f"\n# {mode}: {msg} at {datetime.now().strftime('%H:%M:%S')} #")
-                    fh.write("\n========================================")
-            
-        
-    
 
 def debug(func):
     """
     Print the function signature and returns value
     SOURCE: https://realpython.com/primer-on-python-decorators/#debugging-code
+
+    What is wrapped is decided once when the function is decorated:
+    with neither CALLS_DEBUG nor TRACING set, the function is returned as it is,
+    so calling it costs nothing extra.
+    With TRACING set, every call is recorded as a span by the tracer.
     
     Parameters
     ----------
@@ -75,16 +283,36 @@ def debug(func):
     ----
     general error.
     """
+    if not CALLS_DEBUG and not TRACING:
+        return func
+
+    if not CALLS_DEBUG:
+        name = func.__qualname__
+        clock = perf_counter_ns
+        record = tracer.record
+
+        @functools.wraps(func)
+        def wrapper_trace(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, start, clock())
+        return wrapper_trace
+
     @functools.wraps(func)
     def wrapper_debug(*args, **kwargs):
         args_repr = [repr(a) for a in args]                      # 1
         kwargs_repr = [f"{k}={v!r}" for k, v in kwargs.items()]  # 2
         signature = ", ".join(args_repr + kwargs_repr)           # 3
-        if CALLS_DEBUG:
-            print_log(f"CALLEING {func.__name__}({signature})")
-        value = func(*args, **kwargs)
-        if CALLS_DEBUG:
-            print_log(f"{func.__name__!r} RETURNED {value!r}")           # 4
+        print_log(f"CALLEING {func.__name__}({signature})")
+        start = perf_counter_ns()
+        try:
+            value = func(*args, **kwargs)
+        finally:
+            if TRACING:
+                tracer.record(func.__qualname__, start, perf_counter_ns())
+        print_log(f"{func.__name__!r} RETURNED {value!r}")           # 4
         return value
     return wrapper_debug
 